@@ -0,0 +1,275 @@
+import numpy as np
+
+from transformator.rules import node_matches
+from transformator.tree import node_codec
+
+
+CHUNK_SIZE = 1 << 16
+
+
+def code_table(predicate):
+    result = np.zeros(256, dtype=bool)
+
+    for code, node in enumerate(node_codec.nodes):
+        result[code] = predicate(node)
+
+    return result
+
+
+def mark_codes(codes, marks):
+    table = np.arange(256, dtype=np.uint8)
+
+    for code in np.unique(codes):
+        table[code] = node_codec.encode(node_codec.decode(int(code)) + marks)
+
+    return table[codes]
+
+
+def encode_trees(trees):
+    sizes = {len(tree) for tree in trees}
+
+    if len(sizes) > 1:
+        raise ValueError(f"Trees of different sizes cannot be packed together: {sorted(sizes)}")
+
+    data = b"".join(tree.codes for tree in trees)
+
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(trees), -1)
+
+
+def get_subtree_ends(codes):
+    count, size = codes.shape
+
+    leaves = code_table(lambda node: node[0] is None)[codes]
+    rows = np.arange(count)
+
+    ends = np.empty((count, size + 1), dtype=np.intp)
+    ends[:, size] = size
+
+    for j in range(size - 1, -1, -1):
+        ends[:, j] = np.where(leaves[:, j], j + 1, ends[rows, ends[:, j + 1]])
+
+    return ends
+
+
+def splice(codes, ends, rows, idx, kind_idx, segments):
+    count = len(rows)
+    size = codes.shape[1]
+
+    source = codes[rows]
+    end = ends[rows, idx]
+    middle = np.where(end == idx + 1, idx + 1, ends[rows, min(idx + 1, size)])
+
+    literals = [value for name, value in segments if name is None]
+    if literals:
+        literal_codes = np.frombuffer(node_codec.encode_all(literals), dtype=np.uint8)
+        source = np.hstack([source, np.broadcast_to(literal_codes, (count, len(literals)))])
+
+    full = lambda value: np.full(count, value, dtype=np.intp)
+
+    placeholders = {
+        "kind": (kind_idx, full(1)),
+        "parent_kind": (full(idx), full(1)),
+        "left": (full(idx + 1), middle - idx - 1),
+        "right": (middle, end - middle),
+    }
+
+    pieces = [(full(0), full(idx), ())]
+    literal_idx = size
+
+    for name, value in segments:
+        if name is None:
+            pieces.append((full(literal_idx), full(1), ()))
+            literal_idx += 1
+        else:
+            start, length = placeholders[name]
+            pieces.append((start, length, value))
+
+    pieces.append((end, size - end, ()))
+
+    total = sum(length for _, length, _ in pieces)
+
+    for width in np.unique(total):
+        selected = np.nonzero(total == width)[0]
+        offset = np.zeros(len(selected), dtype=np.intp)
+        gather = np.zeros((len(selected), width), dtype=np.intp)
+        marked = []
+
+        for start, length, marks in pieces:
+            start = start[selected]
+            length = length[selected]
+
+            for t in range(int(length.max(initial=0))):
+                mask = np.nonzero(t < length)[0]
+                gather[mask, offset[mask] + t] = start[mask] + t
+
+            if marks:
+                mask = np.nonzero(length > 0)[0]
+                marked.append((mask, offset[mask], marks))
+
+            offset = offset + length
+
+        result = np.take_along_axis(source[selected], gather, axis=1)
+
+        for mask, columns, marks in marked:
+            result[mask, columns] = mark_codes(result[mask, columns], marks)
+
+        yield rows[selected], result
+
+
+def apply_rule(codes, rule, ends=None):
+    count, size = codes.shape
+    ends = get_subtree_ends(codes) if ends is None else ends
+
+    leaves = code_table(lambda node: node[0] is None)
+    kinds = code_table(lambda node: node_matches(rule.kind, node))
+    parent_kinds = code_table(lambda node: node_matches(rule.parent_kind, node))
+
+    visit_left = rule.visit in ("parent_subtree", "right_parent_subtree")
+    visit_right = rule.visit in ("parent_subtree", "left_parent_subtree")
+
+    all_rows = np.arange(count)
+
+    keys = []
+    chunks = []
+    offsets = []
+    position = 0
+
+    for idx in range(size):
+        column = codes[:, idx]
+
+        if rule.visit == "subtree":
+            rows = np.nonzero(kinds[column])[0]
+            candidates = [(0, rows, np.full(len(rows), idx, dtype=np.intp))]
+        elif idx + 1 < size:
+            parents = ~leaves[column] & parent_kinds[column]
+            right_idx = np.minimum(ends[:, idx + 1], size - 1)
+
+            candidates = []
+
+            if visit_left:
+                rows = np.nonzero(parents & kinds[codes[:, idx + 1]])[0]
+                candidates.append((0, rows, np.full(len(rows), idx + 1, dtype=np.intp)))
+
+            if visit_right:
+                rows = np.nonzero(parents & kinds[codes[all_rows, right_idx]])[0]
+                candidates.append((1, rows, right_idx[rows]))
+        else:
+            candidates = []
+
+        for side, rows, kind_idx in candidates:
+            if len(rows) == 0:
+                continue
+
+            for selected_rows, result in splice(codes, ends, rows, idx, kind_idx, rule.segments):
+                width = result.shape[1]
+
+                keys.append((selected_rows, np.full(len(selected_rows), idx), np.full(len(selected_rows), side)))
+                chunks.append(result.tobytes())
+                offsets.append(position + width * np.arange(len(selected_rows) + 1))
+
+                position += width * len(selected_rows)
+
+    if not keys:
+        return []
+
+    rows, idxs, sides = (np.concatenate(key) for key in zip(*keys))
+    starts = np.concatenate([offset[:-1] for offset in offsets])
+    stops = np.concatenate([offset[1:] for offset in offsets])
+
+    # restore the order in which Rule.apply visits the trees
+    order = np.lexsort((sides, idxs, rows))
+    data = b"".join(chunks)
+
+    return [
+        (row, data[start:stop])
+        for row, start, stop in zip(rows[order].tolist(), starts[order].tolist(), stops[order].tolist())
+    ]
+
+
+def visit_class(trees, rule, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(trees), chunk_size):
+        chunk = trees[start:start + chunk_size]
+        chunk = chunk if isinstance(chunk, list) else list(chunk)
+
+        try:
+            codes = encode_trees(chunk)
+        except ValueError:
+            for base_idx, tree in enumerate(chunk, start):
+                for t in rule.apply(tree):
+                    yield t, base_idx
+
+            continue
+
+        for row, data in apply_rule(codes, rule):
+            tree = chunk[row]
+            yield tree.from_codes(data, base=tree), start + row
+
+
+def vertex_table(codes, tree_class):
+    present = np.unique(codes)
+    dense = np.zeros(256, dtype=np.intp)
+    dense[present] = np.arange(len(present))
+
+    table = np.zeros((len(present), ) * 3, dtype=bool)
+    leaves = node_codec.leaves
+
+    for i, code in enumerate(present.tolist()):
+        if leaves[code]:
+            continue
+
+        for j, left in enumerate(present.tolist()):
+            for k, right in enumerate(present.tolist()):
+                table[i, j, k] = tree_class.vertex_allowed(code, left, right)
+
+    return dense, table
+
+
+def validate_codes(codes, tree_class):
+    count, size = codes.shape
+
+    leaves = code_table(lambda node: node[0] is None)[codes]
+    dense, table = vertex_table(codes, tree_class)
+    rows = np.arange(count)
+
+    stack = np.zeros((count, size + 1), dtype=np.uint8)
+    top = np.zeros(count, dtype=np.intp)
+    valid = np.ones(count, dtype=bool)
+
+    for j in range(size - 1, -1, -1):
+        column = codes[:, j]
+        leaf = leaves[:, j]
+
+        left = stack[rows, np.maximum(top - 1, 0)]
+        right = stack[rows, np.maximum(top - 2, 0)]
+
+        node = ~leaf
+        valid &= leaf | ((top >= 2) & table[dense[column], dense[left], dense[right]])
+
+        top = np.where(node, np.maximum(top - 1, 1), top)
+        stack[rows, np.where(node, top - 1, top)] = column
+        top = np.where(leaf, top + 1, top)
+
+    return valid & (top == 1)
+
+
+def validate_class(trees, tree_class=None, chunk_size=CHUNK_SIZE):
+    result = []
+
+    for start in range(0, len(trees), chunk_size):
+        chunk = trees[start:start + chunk_size]
+        chunk = chunk if isinstance(chunk, list) else list(chunk)
+
+        if not chunk:
+            continue
+
+        cls = tree_class or chunk[0].__class__
+
+        try:
+            codes = encode_trees(chunk)
+        except ValueError:
+            result.append(np.array(cls.validate_all(chunk), dtype=bool))
+            continue
+
+        result.append(validate_codes(codes, cls))
+
+    return np.concatenate(result) if result else np.zeros(0, dtype=bool)
@@ -0,0 +1,315 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from contextlib import redirect_stdout
+
+from transformator.context import Context
+from transformator.helpers import diff_sorted, expand
+from transformator.lambda_tree import LambdaTree
+from transformator.rules import load_spec
+from transformator.tree import Tree
+
+
+MAIN_SPEC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_spec.json")
+
+VISITS = [
+    "visit_subtrees",
+    "visit_parent_subtrees",
+    "visit_left_parent_subtrees",
+    "visit_right_parent_subtrees",
+]
+
+
+def clear_caches():
+    for cls in (Tree, LambdaTree):
+        for name in ("_family", "_valid_family", "_child_roots", "_count_rooted", "_allows", "_right_count", "_split_count", "_vertex_table"):
+            method = getattr(cls, name, None)
+
+            if method is not None:
+                method.cache_clear()
+
+
+def subtree_visitor(kind, left, right):
+    return [kind] + left + right
+
+
+def parent_subtree_visitor(kind, parent_kind, left, right):
+    return [parent_kind] + left + right
+
+
+def make_context(n, spec_path=MAIN_SPEC):
+    section_expressions, sections = load_spec(spec_path)
+
+    context = Context()
+    context.ns = list(range(n, n - len(section_expressions), -1))
+    context.class_constructor = LambdaTree
+    context.section_expressions = section_expressions
+
+    with redirect_stdout(io.StringIO()):
+        context.define_sections(sections)
+
+    return context
+
+
+def bench_generate(cls):
+    def bench(n):
+        clear_caches()
+        return len(list(cls.generate(n)))
+
+    return bench
+
+
+def bench_generate_pointed(n):
+    clear_caches()
+    return sum(1 for _ in LambdaTree.generate_pointed(n))
+
+
+def bench_pointed_class(n):
+    clear_caches()
+    return sum(1 for _ in LambdaTree.pointed_class(n))
+
+
+def bench_visit(visit):
+    visitor = subtree_visitor if visit == "visit_subtrees" else parent_subtree_visitor
+
+    def prepare(n):
+        return list(LambdaTree.generate(n))
+
+    def bench(trees):
+        return sum(1 for tree in trees for _ in getattr(tree, visit)(visitor))
+
+    return prepare, bench
+
+
+def prepare_rules(n):
+    _, sections = load_spec(MAIN_SPEC)
+    rules = [rule for class_spec in sections for section_spec in class_spec for _, _, rule in section_spec]
+
+    return list(LambdaTree.generate(n)), rules
+
+
+def bench_rules(backend):
+    def bench(data):
+        trees, rules = data
+
+        if backend == "numpy":
+            from transformator import batch
+
+            return sum(1 for rule in rules for _ in batch.visit_class(trees, rule))
+
+        return sum(1 for rule in rules for tree in trees for _ in rule.apply(tree))
+
+    return bench
+
+
+def prepare_validate(n):
+    return list(LambdaTree.generate(n))
+
+
+def bench_validate(backend):
+    def bench(trees):
+        if backend == "numpy":
+            from transformator import batch
+
+            return int(batch.validate_class(trees, LambdaTree).sum())
+
+        return sum(LambdaTree.validate_all(trees))
+
+    return bench
+
+
+def prepare_context(n):
+    context = make_context(n)
+    context.classes
+
+    return context
+
+
+def bench_get_side(context):
+    return len(context.get_side(negative=True)) + len(context.get_side(negative=False))
+
+
+def bench_diff(context):
+    context.clear_stats_cache()
+    context.diff
+
+    return sum(len(part) for _, part in context.iter_parts())
+
+
+def prepare_sides(n):
+    context = make_context(n)
+
+    minus = [str(tree) for tree, _ in expand(context.get_side(negative=True))]
+    plus = [str(tree) for tree, _ in expand(context.get_side(negative=False))]
+
+    return minus, plus
+
+
+def bench_diff_sorted(sides):
+    minus, plus = sides
+    sum(1 for _ in diff_sorted(minus, plus))
+
+    return len(minus) + len(plus)
+
+
+def bench_end_to_end(n):
+    clear_caches()
+
+    context = make_context(n)
+
+    with redirect_stdout(io.StringIO()):
+        context.print_stats()
+
+    return sum(len(part) for _, part in context.iter_parts())
+
+
+def get_benchmarks():
+    result = [
+        ("tree_generate", None, bench_generate(Tree)),
+        ("lambda_tree_generate", None, bench_generate(LambdaTree)),
+        ("generate_pointed", None, bench_generate_pointed),
+        ("pointed_class", None, bench_pointed_class),
+    ]
+
+    for visit in VISITS:
+        prepare, bench = bench_visit(visit)
+        result.append((visit, prepare, bench))
+
+    result.extend([
+        ("rules_python", prepare_rules, bench_rules("python")),
+        ("rules_numpy", prepare_rules, bench_rules("numpy")),
+        ("validate_python", prepare_validate, bench_validate("python")),
+        ("validate_numpy", prepare_validate, bench_validate("numpy")),
+        ("context_get_side", prepare_context, bench_get_side),
+        ("context_diff", prepare_context, bench_diff),
+        ("helpers_diff_sorted", prepare_sides, bench_diff_sorted),
+        ("end_to_end", None, bench_end_to_end),
+    ])
+
+    return result
+
+
+def measure(prepare, bench, n, repeat=1):
+    data = prepare(n) if prepare is not None else n
+
+    best = None
+    items = 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = bench(data)
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    data = prepare(n) if prepare is not None else n
+
+    tracemalloc.start()
+    try:
+        bench(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": best,
+        "items": items,
+        "items_per_second": items / best if best > 0 else None,
+        "peak_bytes": peak,
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(ns, names=None, repeat=1):
+    results = []
+
+    for name, prepare, bench in get_benchmarks():
+        if names and name not in names:
+            continue
+
+        for n in ns:
+            result = {"name": name, "n": n}
+            result.update(measure(prepare, bench, n, repeat))
+            results.append(result)
+
+            print_result(result)
+
+    return {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def print_result(result, baseline=None):
+    line = (
+        f"{result['name']:28} n={result['n']:<2d} "
+        f"{result['seconds']:10.4f}s {result['items']:10d} items "
+        f"{result['items_per_second'] or 0:12.0f}/s {result['peak_bytes'] / 2 ** 20:9.2f} MiB"
+    )
+
+    if baseline is not None and baseline["seconds"] > 0:
+        line += f" | x{result['seconds'] / baseline['seconds']:.2f} time"
+
+    print(line)
+
+
+def compare(current, baseline):
+    old = {(result["name"], result["n"]): result for result in baseline["results"]}
+
+    print(f"=== {baseline.get('commit')} -> {current.get('commit')} ===")
+
+    for result in current["results"]:
+        print_result(result, old.get((result["name"], result["n"])))
+
+
+def parse_ns(value):
+    if "-" in value:
+        start, end = value.split("-")
+        return list(range(int(start), int(end) + 1))
+
+    return [int(n) for n in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tree generation, visitors and diffing.")
+    parser.add_argument("--ns", type=parse_ns, default=parse_ns("3-8"), help="range such as 3-8 or list such as 3,5,7")
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+
+    args = parser.parse_args(argv)
+
+    results = run(args.ns, args.only, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import mmap
+import os
+
+from array import array
+
+from transformator.tree import node_codec
+
+
+FORMAT_VERSION = 1
+MAGIC = b"TRANSFORMATOR\n"
+
+
+class NodeTable:
+    # files store codes local to the file, the header maps them back to nodes
+    def __init__(self):
+        self.nodes = []
+        self._local_codes = {}
+
+    def add(self, codes):
+        for code in codes:
+            if code not in self._local_codes:
+                self._local_codes[code] = len(self.nodes)
+                self.nodes.append(list(node_codec.decode(code)))
+
+    def translation(self):
+        result = bytearray(range(256))
+
+        for code, local_code in self._local_codes.items():
+            result[code] = local_code
+
+        return result
+
+    @staticmethod
+    def load_translation(nodes):
+        result = bytearray(range(256))
+
+        for local_code, node in enumerate(nodes):
+            result[local_code] = node_codec.encode(tuple(node))
+
+        return result
+
+
+def write_trees(path, trees, with_bases=False):
+    table = NodeTable()
+
+    offsets = array("Q", [0])
+    bases = array("q")
+    data = bytearray()
+
+    for tree in trees:
+        if with_bases:
+            tree, base_idx = tree
+            bases.append(base_idx)
+
+        table.add(tree.codes)
+
+        data.extend(tree.codes)
+        offsets.append(len(data))
+
+    header = {
+        "version": FORMAT_VERSION,
+        "nodes": table.nodes,
+        "count": len(offsets) - 1,
+        "bases": with_bases,
+    }
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header).encode() + b"\n")
+
+        # keep the arrays aligned for memoryview casts
+        f.write(b"\0" * (-f.tell() % 8))
+
+        f.write(offsets.tobytes())
+
+        if with_bases:
+            f.write(bases.tobytes())
+
+        f.write(bytes(data).translate(table.translation()))
+
+    os.replace(tmp_path, path)
+
+
+class MappedTrees:
+    def __init__(self, path, tree_class, base_trees=None):
+        self.tree_class = tree_class
+        self.base_trees = base_trees
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a transformator cache file")
+
+        header_end = self._mmap.find(b"\n", len(MAGIC)) + 1
+        header = json.loads(self._mmap[len(MAGIC):header_end])
+
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has unsupported format version {header['version']}")
+
+        self._count = header["count"]
+
+        self._translation = NodeTable.load_translation(header["nodes"])
+
+        position = header_end + (-header_end % 8)
+        view = memoryview(self._mmap)
+
+        self._offsets = view[position:position + 8 * (self._count + 1)].cast("Q")
+        position += 8 * (self._count + 1)
+
+        self._bases = None
+        if header["bases"]:
+            self._bases = view[position:position + 8 * self._count].cast("q")
+            position += 8 * self._count
+
+        self._data_start = position
+
+    def __len__(self):
+        return self._count
+
+    def get_codes(self, idx):
+        start = self._data_start + self._offsets[idx]
+        end = self._data_start + self._offsets[idx + 1]
+
+        return self._mmap[start:end].translate(self._translation)
+
+    def get_base_idx(self, idx):
+        return self._bases[idx] if self._bases is not None else None
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._count))]
+
+        if idx < 0:
+            idx += self._count
+
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+
+        extra = {}
+
+        if self._bases is not None and self.base_trees is not None:
+            extra["base"] = self.base_trees[self._bases[idx]]
+
+        return self.tree_class.from_codes(self.get_codes(idx), **extra)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+class DiskCache:
+    def __init__(self, path):
+        self.path = path
+
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def get_key(*parts):
+        data = json.dumps([FORMAT_VERSION] + list(parts), sort_keys=True)
+
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def class_key(self, tree_class, n, kinds=None):
+        kinds = list(kinds or tree_class.kinds)
+
+        return self.get_key("class", f"{tree_class.__module__}.{tree_class.__qualname__}", n, kinds)
+
+    def part_key(self, class_key, visit, rule_key):
+        return self.get_key("part", class_key, visit, rule_key)
+
+    def get_path(self, key):
+        return os.path.join(self.path, f"{key}.trees")
+
+    def __contains__(self, key):
+        return os.path.exists(self.get_path(key))
+
+    def load(self, key, tree_class, base_trees=None):
+        if key not in self:
+            return None
+
+        return MappedTrees(self.get_path(key), tree_class, base_trees)
+
+    def store(self, key, trees, with_bases=False):
+        write_trees(self.get_path(key), trees, with_bases)
+
+    def discard(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(".trees"):
+                os.remove(os.path.join(self.path, name))
@@ -0,0 +1,199 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+
+from contextlib import redirect_stdout
+
+from transformator.benchmark import MAIN_SPEC, parse_ns
+from transformator.context import Context
+from transformator.lambda_tree import LambdaTree
+from transformator.rules import parse_spec
+from transformator.shard import MODES, attach_bases, get_ns, merge_shards, run_shard, write_shard
+from transformator.tree import LazyClass, Tree
+
+
+# (diff engine, streaming), the first one is the reference the others are compared against
+ENGINES = [
+    ("merge", False),
+    ("hash", False),
+    ("merge", True),
+    ("hash", True),
+    ("external", False),
+    ("external", True),
+]
+
+EXTERNAL_RUN_SIZE = 16
+
+GENERATION_CLASSES = [Tree, LambdaTree]
+
+SHARD_COUNT = 3
+SHARD_CHUNK_SIZE = 7
+
+
+def load_specs(path=MAIN_SPEC):
+    with open(path) as f:
+        spec = json.load(f)
+
+    # the full spec cancels out completely, dropping the first part of every section leaves trees on both sides
+    partial = dict(spec, sections=[
+        [section_parts[1:] or section_parts for section_parts in class_sections]
+        for class_sections in spec["sections"]
+    ])
+
+    return {"full": spec, "partial": partial}
+
+
+def make_context(spec, n, **options):
+    section_expressions, sections = parse_spec(spec)
+
+    context = Context(**options)
+    context.ns = get_ns(n, section_expressions)
+    context.class_constructor = LambdaTree
+    context.section_expressions = section_expressions
+
+    with redirect_stdout(io.StringIO()):
+        context.define_sections(sections)
+
+    return context
+
+
+def get_stats(context):
+    out = io.StringIO()
+
+    with redirect_stdout(out):
+        context.print_stats()
+
+    return out.getvalue()
+
+
+def diff_key(diff):
+    return [
+        [(str(tree), provenance, weight, str(tree.extra.get("base"))) for tree, provenance, weight in side]
+        for side in diff
+    ]
+
+
+def check_diff_engines(spec, n):
+    errors = []
+    reference = None
+
+    for engine, streaming in ENGINES:
+        context = make_context(spec, n, diff_engine=engine, streaming=streaming)
+        result = get_stats(context), diff_key(context.diff)
+
+        if reference is None:
+            reference = result
+            continue
+
+        label = f"{engine}{' streaming' if streaming else ''}"
+
+        if result[0] != reference[0]:
+            errors.append(f"{label} stats differ from {ENGINES[0][0]}")
+
+        if result[1] != reference[1]:
+            errors.append(f"{label} diff differs from {ENGINES[0][0]}")
+
+    # small runs so that the sides are spilled to several files and merged back
+    context = make_context(spec, n, streaming=True)
+
+    if diff_key(context.external_diff(run_size=EXTERNAL_RUN_SIZE)) != reference[1]:
+        errors.append(f"external diff with {EXTERNAL_RUN_SIZE} trees per run differs from {ENGINES[0][0]}")
+
+    return errors
+
+
+def check_shards(spec, n):
+    errors = []
+
+    reference = make_context(spec, n, diff_engine="merge")
+    expected = get_stats(reference), diff_key(reference.diff)
+
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+
+            for index in range(SHARD_COUNT):
+                paths.append(os.path.join(tmp, f"{index}.shard"))
+                write_shard(paths[-1], *run_shard(spec, LambdaTree, n, index, SHARD_COUNT, mode, SHARD_CHUNK_SIZE))
+
+            context = merge_shards(paths)
+
+        for side in context.diff:
+            attach_bases(context, side)
+
+        if get_stats(context) != expected[0]:
+            errors.append(f"{SHARD_COUNT} {mode} shards give different stats than one process")
+
+        if diff_key(context.diff) != expected[1]:
+            errors.append(f"{SHARD_COUNT} {mode} shards give a different diff or bases than one process")
+
+    return errors
+
+
+def check_generation(n):
+    errors = []
+
+    for cls in GENERATION_CLASSES:
+        trees = list(cls.generate(n))
+
+        if len(trees) != cls.count(n):
+            errors.append(f"{cls.__name__}.generate({n}) gives {len(trees)} trees, count gives {cls.count(n)}")
+
+        if [cls.unrank(n, idx) for idx in range(len(trees))] != trees:
+            errors.append(f"{cls.__name__}.unrank({n}, idx) does not follow the generate order")
+
+        if [tree.rank() for tree in trees] != list(range(len(trees))):
+            errors.append(f"{cls.__name__} rank does not invert unrank for n={n}")
+
+        if list(LazyClass(cls, n)) != trees:
+            errors.append(f"LazyClass({cls.__name__}, {n}) does not match generate")
+
+    return errors
+
+
+# (name, check, whether it runs on every spec)
+def get_checks():
+    return [
+        ("diff_engines", check_diff_engines, True),
+        ("shards", check_shards, True),
+        ("generation", check_generation, False),
+    ]
+
+
+def run(ns, names=None, spec_path=MAIN_SPEC):
+    specs = load_specs(spec_path)
+    failed = 0
+
+    for name, check, uses_spec in get_checks():
+        if names and name not in names:
+            continue
+
+        for spec_name, spec in (specs.items() if uses_spec else [("-", None)]):
+            for n in ns:
+                errors = check(spec, n) if uses_spec else check(n)
+                failed += bool(errors)
+
+                print(f"{name:16} {spec_name:8} n={n:<2d} {'FAIL' if errors else 'ok'}")
+
+                for error in errors:
+                    print(f"    {error}")
+
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the diff engines and the other fast paths agree with each other.")
+    parser.add_argument("--ns", type=parse_ns, default=parse_ns("4-5"), help="range such as 4-5 or list such as 4,6")
+    parser.add_argument("--only", nargs="*", help="check names to run")
+    parser.add_argument("--spec", default=MAIN_SPEC, help="JSON section spec to check")
+
+    args = parser.parse_args(argv)
+
+    return 1 if run(args.ns, args.only, args.spec) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
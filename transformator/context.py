@@ -1,6 +1,22 @@
 import functools as fn
+import heapq
+import itertools
+import os
+import time
 
 from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from transformator.cache import DiskCache
+from transformator.external import external_diff
+from transformator.helpers import combine_sorted, diff_sorted_weighted, expand
+from transformator.multiset import SignedMultiset
+from transformator.profiling import Profiler
+from transformator.render import DISPLAY_LIMIT, display_tree_rows, get_page, render_dot, svg_cache, with_bases, write_dot
+from transformator.rules import Rule, visit_tree
+from transformator.tree import LazyClass, Tree
+from transformator.verify import verify_context
 
 
 class cached_property(fn.cached_property):
@@ -13,8 +29,144 @@ class cached_property(fn.cached_property):
         return super().__set_name__(owner, name)
 
 
+class SectionPart:
+    def __init__(self, context, class_idx, multiplier, visit, visitor, streaming=False, entries=None, provenance=None):
+        self.class_idx = class_idx
+        self.multiplier = multiplier
+        self.visit = visit
+        self.visitor = visitor
+        self.provenance = provenance
+
+        self._context = context
+        self._trees = None
+        self._entries = entries
+        self._count = None
+
+        if entries is None and context.is_part_cacheable(visitor):
+            self._trees = context.load_part(class_idx, visit, visitor, provenance)
+        elif entries is None and not streaming:
+            self._trees = list(self.generate())
+
+    @property
+    def streaming(self):
+        return self._trees is None and self._entries is None
+
+    @property
+    def trees(self):
+        if self._trees is not None:
+            return self._trees
+
+        if self._entries is not None:
+            return (tree for tree, weight in self._entries for _ in range(weight))
+
+        return self.generate()
+
+    def entries(self):
+        if self._entries is not None:
+            return iter(self._entries)
+
+        return ((tree, 1) for tree in self.trees)
+
+    def generate(self):
+        for tree, _ in self.generate_with_bases():
+            yield tree
+
+    def generate_with_bases(self):
+        return self._context.visit_part_class(self.class_idx, self.visit, self.visitor, self.provenance)
+
+    def __iter__(self):
+        return iter(self.trees)
+
+    def __len__(self):
+        if self._trees is not None:
+            return len(self._trees)
+
+        if self._count is None:
+            self._count = sum(weight for _, weight in self.entries())
+
+        return self._count
+
+
+def visit_class(trees, visit, visitor, backend="python"):
+    if backend == "numpy" and isinstance(visitor, Rule) and visitor.visit_method == visit:
+        from transformator import batch
+
+        yield from batch.visit_class(trees, visitor)
+        return
+
+    for base_idx, tree in enumerate(trees):
+        for t in visit_tree(tree, visit, visitor):
+            yield t, base_idx
+
+
+def validate_class(trees, tree_class=None, backend="python"):
+    if backend == "numpy":
+        from transformator import batch
+
+        return batch.validate_class(trees, tree_class).tolist()
+
+    if tree_class is None:
+        return [tree.validate() for tree in trees]
+
+    return tree_class.validate_all(trees)
+
+
+def evaluate_class_chunk(trees, class_spec):
+    result = []
+
+    for section_spec in class_spec:
+        result.append([])
+
+        for multiplier, visit, visitor in section_spec:
+            entries = {}
+
+            for tree in trees:
+                for t in visit_tree(tree, visit, visitor):
+                    entry = entries.get(t.codes)
+
+                    if entry is None:
+                        entries[t.codes] = [t, 1]
+                    else:
+                        entry[0] = t
+                        entry[1] += 1
+
+            result[-1].append([tuple(entry) for entry in entries.values()])
+
+    return result
+
+
+def fold_chunk_entries(entries, chunk):
+    for tree, weight in chunk:
+        entry = entries.get(tree.codes)
+
+        if entry is None:
+            entries[tree.codes] = [tree, weight]
+        else:
+            entry[0] = tree
+            entry[1] += weight
+
+    return entries
+
+
+def merge_chunk_entries(chunks):
+    entries = {}
+
+    for chunk in chunks:
+        fold_chunk_entries(entries, chunk)
+
+    return [tuple(entry) for entry in entries.values()]
+
+
+@fn.lru_cache(maxsize=None)
+def compile_section_equation(equation, context_n_identifier, class_identifier):
+    size_identifier = f"{class_identifier}{context_n_identifier}"
+    source = f"lambda {context_n_identifier}, {size_identifier}: ({equation})"
+
+    return eval(compile(source, f"<section equation {equation!r}>", "eval"), {})
+
+
 class Context:
-    def __init__(self, context_n_identifier="k", class_identifier="T"):
+    def __init__(self, context_n_identifier="k", class_identifier="T", streaming=False, diff_engine="hash", cache=None, lazy_classes=False, backend="python", spill_dir=None):
         self._ns = None
         self._class_constructor = None
         self._section_expressions = None
@@ -25,6 +177,20 @@ class Context:
         self._context_n_identifier = context_n_identifier
         self._class_identifier = class_identifier
 
+        self.streaming = streaming
+        self.diff_engine = diff_engine
+        self.cache = DiskCache(cache) if isinstance(cache, str) else cache
+        self.lazy_classes = lazy_classes
+        self.backend = backend
+        self.spill_dir = spill_dir
+
+        self.profiler = None
+        self.last_profile = None
+
+        self._class_memo = {}
+        self._class_size_memo = {}
+        self._section_count_memo = {}
+
     @property
     def context_n_identifier(self):
         return self._context_n_identifier
@@ -41,6 +207,10 @@ class Context:
     def ns(self, value):
         self._ns = value
 
+        # sizes and counts are cheap to keep, classes for sizes that left ns hold whole tree lists
+        for n in set(self._class_memo).difference(value or ()):
+            del self._class_memo[n]
+
         self.clear_cache()
 
     @property
@@ -51,6 +221,10 @@ class Context:
     def class_constructor(self, value):
         self._class_constructor = value
 
+        self._class_memo.clear()
+        self._class_size_memo.clear()
+        self._section_count_memo.clear()
+
         self.clear_cache()
 
     @property
@@ -61,19 +235,47 @@ class Context:
     def section_expressions(self, value):
         self._section_expressions = value
 
-        self.clear_cache()
+        self.clear_cached(["section_counts", "classes_counts"])
+
+        if "sections" in self.__dict__:
+            self.resize_sections()
 
     @cached_property
     def classes(self):
-        return [list(self.class_constructor(n)) for n in self.ns]
+        result = []
+
+        for class_idx, n in enumerate(self.ns):
+            if n not in self._class_memo:
+                self._class_memo[n] = self.load_class(class_idx)
+
+            result.append(self._class_memo[n])
+
+        return result
+
+    @cached_property
+    def class_sizes(self):
+        result = []
+
+        for class_idx, n in enumerate(self.ns):
+            if n not in self._class_size_memo:
+                self._class_size_memo[n] = self.count_class(class_idx)
+
+            result.append(self._class_size_memo[n])
+
+        return result
 
     @cached_property
     def section_counts(self):
         result = []
-        for class_idx, _ in enumerate(self.ns):
+        for class_idx, n in enumerate(self.ns):
             result.append([])
             for equation, _ in self.section_expressions[class_idx]:
-                result[-1].append(self.eval_section_equation(equation, class_idx))
+                key = (n, equation)
+
+                if key not in self._section_count_memo:
+                    self._section_count_memo[key] = self.eval_section_equation(equation, class_idx)
+
+                result[-1].append(self._section_count_memo[key])
 
         return result
 
@@ -99,54 +301,147 @@ class Context:
 
     @cached_property
     def diff(self):
+        if self.diff_engine == "hash":
+            if self.streaming:
+                return self.streaming_diff()
+
+            return self.multiset.diff()
+
+        if self.diff_engine == "external":
+            return self.external_diff()
+
+        return self.merge_diff
+
+    @cached_property
+    def multiset(self):
+        return self.build_multiset()
+
+    def build_multiset(self, keep_trees=True):
+        result = SignedMultiset(keep_trees)
+
+        for provenance, part in self.iter_parts():
+            if self.profiler is None:
+                self.add_part_to_multiset(result, provenance, part)
+                continue
+
+            start = time.perf_counter()
+            self.add_part_to_multiset(result, provenance, part)
+            self.profiler.add_diff_time(provenance, time.perf_counter() - start)
+
+        return result
+
+    def streaming_diff(self):
+        # the first pass only counts, the parts are generated again to pick up the trees that survive the cancellation
+        multiset = self.build_multiset(keep_trees=False)
+        multiset.discard_cancelled()
+
+        for provenance, part in self.iter_parts():
+            for tree, _ in part.entries():
+                multiset.attach(tree, provenance)
+
+        return multiset.diff()
+
+    @staticmethod
+    def add_part_to_multiset(multiset, provenance, part):
+        for tree, weight in part.entries():
+            multiset.add(tree, provenance, weight * part.multiplier)
+
+    @cached_property
+    def merge_diff(self):
+        if self.streaming:
+            return self.diff_sides(self.get_side(negative=True), self.get_side(negative=False))
+
+        return self.diff_sides(self.minus, self.plus)
+
+    def external_diff(self, run_size=None):
+        extra = {"run_size": run_size} if run_size is not None else {}
+
+        return external_diff(self.iter_parts, self.spill_dir, **extra)
+
+    @staticmethod
+    def diff_sides(minus_side, plus_side):
         minus = []
         plus = []
 
-        p = 0
-        q = 0
+        pairs = lambda side: (((tree, provenance), weight) for tree, provenance, weight in side)
+        key = lambda data: str(data[0])
 
-        while p < len(self.minus) and q < len(self.plus):
-            minus_key = str(self.minus[p][0])
-            plus_key = str(self.plus[q][0])
+        for label, (tree, provenance), weight in diff_sorted_weighted(pairs(minus_side), pairs(plus_side), key, 0, 1):
+            (plus if label else minus).append((tree, provenance, weight))
 
-            if minus_key < plus_key:
-                minus.append(self.minus[p])
-                p += 1
-            elif minus_key > plus_key:
-                plus.append(self.plus[q])
-                q += 1
-            else:
-                p += 1
-                q += 1
+        return minus, plus
 
-        minus.extend(self.minus[p:])
-        plus.extend(self.plus[q:])
+    def expand_diff(self):
+        return tuple(list(expand(side)) for side in self.diff)
 
-        return minus, plus
+    def verify_diff(self):
+        key = lambda data: (str(data[0]), data[1], data[2])
+
+        return all(
+            list(map(key, hash_side)) == list(map(key, merge_side))
+            for hash_side, merge_side in zip(self.multiset.diff(), self.merge_diff)
+        )
+
+    def iter_parts(self):
+        for class_idx, class_sections in enumerate(self.sections):
+            for section_idx, section_parts in enumerate(class_sections):
+                for part_idx, part in enumerate(section_parts):
+                    yield (class_idx, section_idx, part_idx), part
 
     def get_side(self, negative=False):
         result = []
 
-        multiplier_multiplier = -1 if negative else 1
+        for provenance, part in self.iter_parts():
+            result.append(self.get_part_side(provenance, part, negative))
 
-        for class_idx, class_sections in enumerate(self.sections):
-            for section_idx, section_parts in enumerate(class_sections):
-                for part_idx, (multiplier, trees) in enumerate(section_parts):
-                    for tree in trees:
-                        if multiplier * multiplier_multiplier > 0:
-                            data = (tree, (class_idx, section_idx, part_idx))
+        return list(heapq.merge(*result, key=self.side_sorting_key))
 
-                            for _ in range(abs(multiplier)):
-                                result.append(data)
+    @classmethod
+    def get_part_side(cls, provenance, part, negative=False):
+        multiplier = -part.multiplier if negative else part.multiplier
 
-        sorting_key = lambda data: (str(data[0]), data[1][0], data[1][1], data[1][2])
+        if multiplier <= 0:
+            return []
 
-        result.sort(key=sorting_key)
-        return result
+        entries = sorted(
+            ((tree, provenance, weight * multiplier) for tree, weight in part.entries()),
+            key=cls.side_sorting_key,
+        )
 
-    def define_class(self, k):
-        self.clear_stats_cache()
+        # the last copy of a tree is the one that survives the cancellation
+        pairs = (((tree, provenance), weight) for tree, provenance, weight in entries)
+
+        return [
+            (tree, provenance, weight)
+            for (tree, provenance), weight in combine_sorted(pairs, key=lambda data: str(data[0]))
+        ]
+
+    @staticmethod
+    def side_sorting_key(data):
+        return str(data[0]), data[1][0], data[1][1], data[1][2]
+
+    def add_contributions(self, provenance, part):
+        self.clear_cached(["diff", "merge_diff"])
 
+        if "multiset" in self.__dict__:
+            self.add_part_to_multiset(self.multiset, provenance, part)
+
+        for key, negative in (("minus", True), ("plus", False)):
+            if key in self.__dict__:
+                new = self.get_part_side(provenance, part, negative)
+                self.__dict__[key] = list(heapq.merge(self.__dict__[key], new, key=self.side_sorting_key))
+
+    def discard_contributions(self, prefix):
+        self.clear_cached(["diff", "merge_diff"])
+
+        if "multiset" in self.__dict__:
+            self.multiset.discard(prefix)
+
+        for key in ("minus", "plus"):
+            if key in self.__dict__:
+                self.__dict__[key] = [data for data in self.__dict__[key] if data[1][:len(prefix)] != prefix]
+
+    def define_class(self, k):
         self._active_class = k
         self._active_section = None
 
@@ -155,8 +450,6 @@ class Context:
     def define_section(self, k):
         assert k < len(self.section_expressions[self._active_class])
 
-        self.clear_stats_cache()
-
         self._active_section = k
 
         self.clear_section(self._active_class, self._active_section)
@@ -165,67 +458,157 @@ class Context:
         print(f"# define {self._active_class},{self._active_section}: {equation} [{introduction}]")
 
     def append_r_class_subtree_visitor(self, multiplier, visitor):
-        self.clear_stats_cache()
-
-        trees = sum(
-            [
-                list(t.visit_subtrees(visitor))
-                for t
-                in self.classes[self._active_class]
-            ],
-            []
-        )
-
-        self.sections[self._active_class][self._active_section].append((multiplier, trees))
+        self.append_part(multiplier, "visit_subtrees", visitor)
 
     def append_r_class_parent_subtree_visitor(self, multiplier, visitor):
-        self.clear_stats_cache()
-
-        trees = sum(
-            [
-                list(t.visit_parent_subtrees(visitor))
-                for t
-                in self.classes[self._active_class]
-            ],
-            []
-        )
-
-        self.sections[self._active_class][self._active_section].append((multiplier, trees))
+        self.append_part(multiplier, "visit_parent_subtrees", visitor)
 
     def append_r_class_left_parent_subtree_visitor(self, multiplier, visitor):
-        self.clear_stats_cache()
-
-        trees = sum(
-            [
-                list(t.visit_left_parent_subtrees(visitor))
-                for t
-                in self.classes[self._active_class]
-            ],
-            []
-        )
-
-        self.sections[self._active_class][self._active_section].append((multiplier, trees))
+        self.append_part(multiplier, "visit_left_parent_subtrees", visitor)
 
     def append_r_class_right_parent_subtree_visitor(self, multiplier, visitor):
-        self.clear_stats_cache()
-
-        trees = sum(
-            [
-                list(t.visit_right_parent_subtrees(visitor))
-                for t
-                in self.classes[self._active_class]
-            ],
-            []
+        self.append_part(multiplier, "visit_right_parent_subtrees", visitor)
+
+    def append_rule(self, multiplier, rule):
+        self.append_part(multiplier, rule.visit_method, rule)
+
+    def define_sections(self, spec):
+        for class_idx, class_spec in enumerate(spec):
+            self.define_class(class_idx)
+
+            for section_idx, section_spec in enumerate(class_spec):
+                self.define_section(section_idx)
+
+                for multiplier, visit, visitor in section_spec:
+                    self.append_part(multiplier, visit, visitor)
+
+    def append_part(self, multiplier, visit, visitor):
+        provenance = (self._active_class, self._active_section, len(self.sections[self._active_class][self._active_section]))
+        part = SectionPart(self, self._active_class, multiplier, visit, visitor, streaming=self.streaming, provenance=provenance)
+
+        self.add_section_part(self._active_class, self._active_section, part)
+
+    def add_section_part(self, class_idx, section_idx, part):
+        section_parts = self.sections[class_idx][section_idx]
+        section_parts.append(part)
+
+        self.add_contributions((class_idx, section_idx, len(section_parts) - 1), part)
+
+    def apply_section_spec(self, spec, processes=None, chunk_size=None):
+        processes = processes or os.cpu_count()
+        results = defaultdict(list)
+
+        with ProcessPoolExecutor(processes) as executor:
+            futures = []
+
+            for class_idx, class_spec in enumerate(spec):
+                trees = self.classes[class_idx]
+                size = chunk_size or max(1, -(-len(trees) // (4 * processes)))
+
+                for start in range(0, len(trees), size):
+                    future = executor.submit(evaluate_class_chunk, trees[start:start + size], class_spec)
+                    futures.append((class_idx, future))
+
+            for class_idx, future in futures:
+                results[class_idx].append(future.result())
+
+        for class_idx, class_spec in enumerate(spec):
+            self.clear_class(class_idx)
+
+            for section_idx, section_spec in enumerate(class_spec):
+                for part_idx, (multiplier, visit, visitor) in enumerate(section_spec):
+                    entries = merge_chunk_entries(chunk[section_idx][part_idx] for chunk in results[class_idx])
+                    part = SectionPart(self, class_idx, multiplier, visit, visitor, entries=entries, provenance=(class_idx, section_idx, part_idx))
+
+                    self.add_section_part(class_idx, section_idx, part)
+
+    def load_class(self, class_idx):
+        n = self.ns[class_idx]
+
+        if self.lazy_classes and self.is_tree_class(self.class_constructor):
+            return LazyClass(self.class_constructor, n)
+
+        if self.cache is None or not self.is_tree_class(self.class_constructor):
+            return list(self.construct_class(n))
+
+        key = self.get_class_key(class_idx)
+
+        if key not in self.cache:
+            self.cache.store(key, self.construct_class(n))
+
+        return self.cache.load(key, self.class_constructor)
+
+    def sample_class(self, class_idx, k, random=None):
+        if isinstance(self.classes[class_idx], LazyClass):
+            return self.classes[class_idx].sample(k, random)
+
+        import random as random_module
+
+        return (random or random_module).sample(list(self.classes[class_idx]), k)
+
+    def get_class_key(self, class_idx):
+        return self.cache.class_key(self.class_constructor, self.ns[class_idx])
+
+    def is_part_cacheable(self, visitor):
+        return self.cache is not None and isinstance(visitor, Rule) and self.is_tree_class(self.class_constructor)
+
+    def load_part(self, class_idx, visit, rule, provenance=None):
+        key = self.cache.part_key(self.get_class_key(class_idx), visit, rule.key)
+
+        if key not in self.cache:
+            self.cache.store(key, self.visit_part_class(class_idx, visit, rule, provenance), with_bases=True)
+
+        return self.cache.load(key, self.class_constructor, self.classes[class_idx])
+
+    def visit_part_class(self, class_idx, visit, visitor, provenance=None):
+        trees = self.classes[class_idx]
+
+        if self.profiler is None or provenance is None:
+            return visit_class(trees, visit, visitor, self.backend)
+
+        return self.profiler.profile_part(
+            provenance, len(trees), visit, visitor,
+            lambda visitor: visit_class(trees, visit, visitor, self.backend),
         )
 
-        self.sections[self._active_class][self._active_section].append((multiplier, trees))
+    def validate_class(self, class_idx):
+        tree_class = self.class_constructor if self.is_tree_class(self.class_constructor) else None
+
+        return validate_class(self.classes[class_idx], tree_class, self.backend)
+
+    @contextmanager
+    def profile(self, trace_memory=True):
+        previous = self.profiler
+
+        with Profiler(trace_memory) as profiler:
+            self.profiler = profiler
+
+            try:
+                yield profiler
+            finally:
+                self.profiler = previous
+                self.last_profile = profiler
+
+    def construct_class(self, n):
+        if self.is_tree_class(self.class_constructor):
+            return self.class_constructor.generate(n)
+
+        return self.class_constructor(n)
+
+    def count_class(self, class_idx):
+        if self.is_tree_class(self.class_constructor):
+            return self.class_constructor.count(self.ns[class_idx])
+
+        return len(self.classes[class_idx])
+
+    @staticmethod
+    def is_tree_class(value):
+        return isinstance(value, type) and issubclass(value, Tree)
 
     def eval_section_equation(self, equation, class_idx):
-        ctx = {
-            f"{self.context_n_identifier}": self.ns[class_idx],
-            f"{self.class_identifier}{self.context_n_identifier}": len(self.classes[class_idx]),
-        }
-        return eval(equation, ctx)
+        function = compile_section_equation(equation, self.context_n_identifier, self.class_identifier)
+
+        return function(self.ns[class_idx], self.class_sizes[class_idx])
 
     def clear_all_classes(self):
         for i in range(len(self.sections)):
@@ -234,27 +617,40 @@ class Context:
     def clear_class(self, class_idx=None):
         class_idx = class_idx if class_idx is not None else self._active_class
 
+        self.discard_contributions((class_idx, ))
+
         self.sections[class_idx] = [[] for _ in range(len(self.section_expressions[class_idx]))]
 
     def clear_section(self, class_idx, section_idx):
         class_idx = class_idx if class_idx is not None else self._active_class
         section_idx = section_idx if section_idx is not None else self._active_section
 
+        self.discard_contributions((class_idx, section_idx))
+
         self.sections[class_idx][section_idx] = []
 
+    def resize_sections(self):
+        for class_idx, class_sections in enumerate(self.sections):
+            size = len(self.section_expressions[class_idx])
+
+            for section_idx in range(size, len(class_sections)):
+                self.discard_contributions((class_idx, section_idx))
+
+            del class_sections[size:]
+            class_sections.extend([] for _ in range(size - len(class_sections)))
+
     def clear_cache(self):
-        for key in self._cached:  # set by @cached_property
+        self.clear_cached(self._cached)  # set by @cached_property
+
+    def clear_cached(self, keys):
+        for key in keys:
             try:
                 delattr(self, key)
             except AttributeError:
                 pass
 
     def clear_stats_cache(self):
-        for key in ["plus", "minus", "diff"]:
-            try:
-                delattr(self, key)
-            except AttributeError:
-                pass
+        self.clear_cached(["plus", "minus", "diff", "multiset", "merge_diff"])
 
     def print_all_classes_stats(self, class_idx=None):
         print("=== Classes stats ===")
@@ -280,20 +676,49 @@ class Context:
 
         section_count = self.section_counts[class_idx][section_idx]
         equation, introductions = self.section_expressions[class_idx][section_idx]
-        count = sum(map(lambda x: x[0] * len(x[1]), self.sections[class_idx][section_idx]))
+        count = sum(part.multiplier * len(part) for part in self.sections[class_idx][section_idx])
 
         ready = section_count == count
 
         print(f"[{'x' if ready else ' '}]  {class_idx},{section_idx}: {count:7d} of {section_count:7d} | {equation:25} [{introductions}]")
 
+    def verify_sections(self, class_idx=None, max_examples=10):
+        return verify_context(self, class_idx, max_examples)
+
+    def print_verify_stats(self, class_idx=None, max_examples=3):
+        print("=== Verify stats ===")
+
+        for report in self.verify_sections(class_idx, max_examples):
+            ready = report["injective"] and report["outputs"] == report["expected"]
+            coverage = " ".join(f"{part['covered_bases']}/{part['class_size']}" for part in report["parts"])
+
+            print(
+                f"[{'x' if ready else ' '}]  {report['class']},{report['section']}: "
+                f"{report['distinct']:7d} distinct {report['collision_count']:5d} collisions | bases {coverage}"
+            )
+
+            for example in report["collisions"]:
+                print(f"      {example['first']} ~ {example['second']}{'' if example['confirmed'] else ' (hash only)'}")
+
+    def print_profile_stats(self, sort=None, limit=None, baseline=None):
+        print("=== Profile stats ===")
+
+        profiler = self.profiler or self.last_profile
+
+        if profiler is None:
+            print("no profile recorded, run inside `with context.profile():`")
+            return
+
+        profiler.print_report(sort, limit, baseline)
+
     def print_diff_stats(self):
         print("=== Diff stats ===")
         result = defaultdict(lambda: [0, 0])
 
         for i in range(2):
-            for k in self.diff[i]:
-                key = k[1][:2]
-                result[key][i] += 1
+            for _, provenance, weight in self.diff[i]:
+                key = provenance[:2]
+                result[key][i] += weight
 
         for key in result:
             print(f"{key[0]},{key[1]}: {result[key][0]:5d} {result[key][1]:5d}")
@@ -302,42 +727,72 @@ class Context:
         self.print_all_classes_stats()
         self.print_diff_stats()
 
-    def display_diff_trees(self, class_idx=None, section_idx=None, part_idx=None):
-        self.display_diff_trees_side(0, class_idx, section_idx, part_idx)
-        self.display_diff_trees_side(1, class_idx, section_idx, part_idx)
+    def display_diff_trees(self, class_idx=None, section_idx=None, part_idx=None, page=0, limit=DISPLAY_LIMIT):
+        self.display_diff_trees_side(0, class_idx, section_idx, part_idx, page, limit)
+        self.display_diff_trees_side(1, class_idx, section_idx, part_idx, page, limit)
 
-    def display_diff_trees_side(self, side, class_idx=None, section_idx=None, part_idx=None):
+    def display_diff_trees_side(self, side, class_idx=None, section_idx=None, part_idx=None, page=0, limit=DISPLAY_LIMIT):
         from IPython.display import display, HTML
-        import pyAgrum.lib.notebook as gnb
 
         filter_key = lambda x: \
             (class_idx is None or x[1][0] == class_idx) and \
             (section_idx is None or x[1][1] == section_idx) and \
             (part_idx is None or x[1][2] == part_idx)
 
-        trees = filter(filter_key, self.diff[side])
+        trees = list(filter(filter_key, self.diff[side]))
+        shown, start = get_page(trees, page, limit)
+
+        display(HTML(f"=== {'Minus' if side == 0 else 'Plus'} === {start}-{start + len(shown)} of {len(trees)}"))
+        display_tree_rows((f"{provenance} x{weight}", (tree, tree.extra["base"])) for tree, provenance, weight in shown)
 
-        display(HTML(f"=== {'Minus' if side == 0 else 'Plus'} ==="))
-        for tree, _ in trees:
-            gnb.sideBySide(tree, tree.extra["base"])
+        following, _ = get_page(trees, page + 1, limit)
+        svg_cache.prefetch(with_bases(tree for tree, _, _ in following))
 
-    def display_trees(self, class_idx=None, section_idx=None, part_idx=None):
+    def display_trees(self, class_idx=None, section_idx=None, part_idx=None, page=0, limit=DISPLAY_LIMIT):
         if class_idx is None:
             for i in range(len(self.sections)):
-                self.display_trees(i)
+                self.display_trees(i, page=page, limit=limit)
         elif section_idx is None:
             for i in range(len(self.sections[class_idx])):
-                self.display_trees(class_idx, i)
+                self.display_trees(class_idx, i, page=page, limit=limit)
         elif part_idx is None:
             for i in range(len(self.sections[class_idx][section_idx])):
-                self.display_trees(class_idx, section_idx, i)
+                self.display_trees(class_idx, section_idx, i, page=page, limit=limit)
         else:
             from IPython.display import display, HTML
-            import pyAgrum.lib.notebook as gnb
 
-            multiplier, trees = self.sections[class_idx][section_idx][part_idx]
+            part = self.sections[class_idx][section_idx][part_idx]
+            shown, start = get_page(part, page, limit)
+
+            display(HTML(f"{class_idx},{section_idx},{part_idx}: {part.multiplier} * {len(part)} | {start}-{start + len(shown)}"))
+            display_tree_rows((str(start + i), (tree, tree.extra["base"])) for i, tree in enumerate(shown))
+
+    def export_dot(self, path, class_idx=None, section_idx=None, part_idx=None, side=None, limit=None, format=None):
+        if side is not None:
+            filter_key = lambda x: \
+                (class_idx is None or x[1][0] == class_idx) and \
+                (section_idx is None or x[1][1] == section_idx) and \
+                (part_idx is None or x[1][2] == part_idx)
+
+            items = (
+                (f"{'-' if side == 0 else '+'} {provenance} x{weight}", (tree, tree.extra["base"]))
+                for tree, provenance, weight in filter(filter_key, self.diff[side])
+            )
+        elif section_idx is not None:
+            items = (
+                (f"{(class_idx, section_idx, i)} #{j}", (tree, tree.extra["base"]))
+                for i, part in enumerate(self.sections[class_idx][section_idx])
+                if part_idx is None or part_idx == i
+                for j, tree in enumerate(part)
+            )
+        elif class_idx is not None:
+            items = ((f"{class_idx} #{j}", (tree, )) for j, tree in enumerate(self.classes[class_idx]))
+        else:
+            raise ValueError("Select a class, a section or a diff side to export")
+
+        write_dot(path, itertools.islice(items, limit))
 
-            display(HTML(f"{class_idx},{section_idx},{part_idx}: {multiplier} * {len(trees)}"))
+        if format is None:
+            return path
 
-            for i, tree in enumerate(trees):
-                gnb.sideBySide(tree, tree.extra["base"])
+        return render_dot(path, format)
@@ -0,0 +1,99 @@
+import heapq
+import os
+import pickle
+import tempfile
+
+from transformator.helpers import combine_sorted, diff_sorted_weighted
+
+
+RUN_SIZE = 1 << 18
+CHUNK_SIZE = 1 << 12
+
+
+def write_run(path, records):
+    with open(path, "wb") as f:
+        for start in range(0, len(records), CHUNK_SIZE):
+            pickle.dump(records[start:start + CHUNK_SIZE], f, pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+
+            yield from chunk
+
+
+def spill_runs(records, directory, prefix="run", run_size=RUN_SIZE):
+    paths = []
+    buffer = []
+
+    def flush():
+        buffer.sort()
+
+        path = os.path.join(directory, f"{prefix}-{len(paths)}.run")
+        write_run(path, buffer)
+        paths.append(path)
+
+        buffer.clear()
+
+    for record in records:
+        buffer.append(record)
+
+        if len(buffer) >= run_size:
+            flush()
+
+    if buffer:
+        flush()
+
+    return paths
+
+
+def external_sort(records, directory, prefix="run", run_size=RUN_SIZE):
+    paths = spill_runs(records, directory, prefix, run_size)
+
+    return heapq.merge(*(read_run(path) for path in paths))
+
+
+def side_records(parts, negative=False):
+    # the sequence number keeps equal (tree, provenance) records in generation order, as the stable in-memory sort does
+    sequence = 0
+
+    for provenance, part in parts:
+        multiplier = -part.multiplier if negative else part.multiplier
+
+        if multiplier <= 0:
+            continue
+
+        for tree, weight in part.entries():
+            yield (str(tree), ) + provenance + (sequence, tree, weight * multiplier)
+            sequence += 1
+
+
+def weighted_side(records):
+    # copies of a tree in one part collapse into one entry, the last copy is the representative
+    pairs = ((record[:-1], record[-1]) for record in records)
+
+    return combine_sorted(pairs, key=lambda record: record[:4])
+
+
+def iter_external_diff(get_parts, directory, run_size=RUN_SIZE):
+    minus = weighted_side(external_sort(side_records(get_parts(), negative=True), directory, "minus", run_size))
+    plus = weighted_side(external_sort(side_records(get_parts(), negative=False), directory, "plus", run_size))
+
+    for label, record, weight in diff_sorted_weighted(minus, plus, key=lambda record: record[0], first_label=0, second_label=1):
+        yield label, (record[-1], record[1:4], weight)
+
+
+def external_diff(get_parts, directory=None, run_size=RUN_SIZE):
+    minus = []
+    plus = []
+
+    with tempfile.TemporaryDirectory(prefix="transformator-", dir=directory) as tmp:
+        for label, data in iter_external_diff(get_parts, tmp, run_size):
+            (plus if label else minus).append(data)
+
+    return minus, plus
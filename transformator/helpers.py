@@ -63,3 +63,76 @@ def diff_sorted(first, second, key=None, first_label="first", second_label="seco
             yield second_label, next(second_generator)
     except StopIteration:
         pass
+
+
+def combine_sorted(items, key=None):
+    key = key or (lambda x: x)
+
+    current = None
+
+    for value, weight in items:
+        k = key(value)
+
+        if current is not None and current[0] == k:
+            current[1] = value
+            current[2] += weight
+            continue
+
+        if current is not None:
+            yield current[1], current[2]
+
+        current = [k, value, weight]
+
+    if current is not None:
+        yield current[1], current[2]
+
+
+def diff_sorted_weighted(first, second, key=None, first_label="first", second_label="second"):
+    key = key or (lambda x: x)
+
+    def keyed(items):
+        for value, weight in items:
+            if weight > 0:
+                yield key(value), value, weight
+
+    first_generator = keyed(first)
+    second_generator = keyed(second)
+
+    p = next(first_generator, None)
+    q = next(second_generator, None)
+
+    while p is not None and q is not None:
+        if p[0] == q[0]:
+            taken = min(p[2], q[2])
+
+            p = (p[0], p[1], p[2] - taken)
+            q = (q[0], q[1], q[2] - taken)
+
+            if p[2] == 0:
+                p = next(first_generator, None)
+
+            if q[2] == 0:
+                q = next(second_generator, None)
+
+        elif p[0] < q[0]:
+            yield first_label, p[1], p[2]
+            p = next(first_generator, None)
+        else:
+            yield second_label, q[1], q[2]
+            q = next(second_generator, None)
+
+    while p is not None:
+        yield first_label, p[1], p[2]
+        p = next(first_generator, None)
+
+    while q is not None:
+        yield second_label, q[1], q[2]
+        q = next(second_generator, None)
+
+
+def expand(entries):
+    for *data, weight in entries:
+        data = tuple(data)
+
+        for _ in range(weight):
+            yield data
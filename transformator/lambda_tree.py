@@ -1,91 +1,39 @@
+from transformator.rules import node_matches
 from transformator.tree import Tree
 
 
 class LambdaTree(Tree):
+    __slots__ = ()
+
     kinds = ["l", "a", "s", "o"]
 
+    # allowed roots of the left and right child of every kind
+    vertex_children = {
+        "l": ("node", "leaf"),
+        "s": ("leaf", ("s", "o")),
+        "a": ("node", "node"),
+        "o": ("leaf", "leaf"),
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     def validate_vertex(self, kind, children):
-        left, right = children
-
-        sk = kind[0]
-        sl = left[0] if left is not None else None
-        sr = right[0] if right is not None else None
-
-        if sk == "l":
-            if sl is None:
-                return False
-            if sr is not None:
-                return False
-
-        elif sk == "s":
-            if sl is not None:
-                return False
-            if sr not in ("s", "o"):
-                return False
-
-        elif sk == "a":
-            if sl is None:
-                return False
-            if sr is None:
-                return False
+        patterns = self.vertex_children.get(kind[0])
 
-        elif sk == "o":
-            if sl is not None:
-                return False
-            if sr is not None:
-                return False
-
-        else:
+        if patterns is None:
             return False
 
-        return True
+        return all(node_matches(pattern, child) for pattern, child in zip(patterns, children))
 
     @classmethod
-    def generate(cls, n, kinds=None, validate=True):
-        kinds = kinds or cls.kinds
-
-        if n == 0:
-            yield cls([None])
-
-        if n == 1:
-            yield cls(["o", None, None])
-
-        else:
-            for kind in kinds:
-                if kind == "o":
-                    pass
+    def get_kinds(cls, kinds=None):
+        kinds = tuple(kinds or cls.kinds)
 
-                elif kind == "l" and n >= 2:
-                    for left in cls.generate(n - 1, kinds, validate=False):
-                        result = cls(["l"] + left.pre_order + [None])
+        # "o" is the only tree of size 1 and ends every "s" chain, it is always available
+        return kinds if "o" in kinds else kinds + ("o", )
 
-                        if validate:
-                            assert result.validate(), result
-
-                        yield result
-
-                elif kind == "s" and n >= 2:
-                    for right in cls.generate(n - 1, ["s", "o"], validate=False):
-                        result = cls(["s", None] + right.pre_order)
-
-                        if validate:
-                            assert result.validate(), result
-
-                        yield result
-
-                elif kind == "a" and n >= 3:
-                    for i in range(1, n - 1):
-                        left_n = n - i - 1
-                        right_n = i
-
-                        for left in cls.generate(left_n, kinds, validate=False):
-                            for right in cls.generate(right_n, kinds, validate=False):
-                                result = cls(["a"] + left.pre_order + right.pre_order)
-
-                                if validate:
-                                    assert result.validate(), result
-
-                                yield result
+    @classmethod
+    def generate(cls, n, kinds=None, validate=True):
+        # the grammar only builds valid trees, validate=False just skipped the assertion
+        yield from super().generate(n, kinds)
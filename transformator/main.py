@@ -1,12 +1,88 @@
+import argparse
+import json
+import sys
+
+from transformator.shard import MODES, attach_bases, load_tree_class, merge_shards, run_shard, write_shard
 from transformator.tree import Tree
 
 
-def main():
+DEFAULT_TREE_CLASS = "transformator.lambda_tree.LambdaTree"
+
+
+def parse_shard(value):
+    index, _, count = value.partition("/")
+
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a shard such as 0/4, got {value!r}")
+
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index {index} is out of range for {count} shards")
+
+    return index, count
+
+
+def run(args):
+    with open(args.spec) as f:
+        spec = json.load(f)
+
+    index, count = args.shard
+    header, parts = run_shard(spec, load_tree_class(args.tree_class), args.n, index, count, args.mode)
+
+    write_shard(args.output, header, parts)
+
+    outputs = sum(entry[0] for entries in parts.values() for entry in entries.values())
+    print(f"shard {index}/{count} ({args.mode}): {outputs} outputs in {len(parts)} parts -> {args.output}")
+
+
+def merge(args):
+    context = merge_shards(args.shards, args.allow_partial)
+    context.diff_engine = args.diff_engine
+
+    context.print_stats()
+
+    if args.diff:
+        for label, side in zip(("Minus", "Plus"), context.diff):
+            print(f"=== {label} ===")
+
+            for tree, provenance, weight in attach_bases(context, side):
+                print(f"{provenance} x{weight}: {tree} <- {tree.extra['base']}")
+
+
+def demo(args):
     t = Tree(("@", "l", "0", None, None, None, None))
     t.graph.view()
 
     t.visit_subtrees(lambda kind, left, right: ["l", kind] + left + right)
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate section specs over shards of the tree classes and merge the results.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="evaluate a spec over one shard of each class")
+    run_parser.add_argument("spec", help="JSON section spec, such as main_spec.json")
+    run_parser.add_argument("--n", type=int, required=True, help="size of the first class")
+    run_parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="shard to evaluate, such as 0/4")
+    run_parser.add_argument("--mode", choices=MODES, default="range", help="split classes by index range or by tree hash")
+    run_parser.add_argument("--tree-class", default=DEFAULT_TREE_CLASS)
+    run_parser.add_argument("-o", "--output", required=True, help="partial multiset file to write")
+    run_parser.set_defaults(function=run)
+
+    merge_parser = commands.add_parser("merge", help="combine shard files and print the stats")
+    merge_parser.add_argument("shards", nargs="+", help="partial multiset files written by run")
+    merge_parser.add_argument("--diff", action="store_true", help="also print the remaining trees")
+    merge_parser.add_argument("--diff-engine", choices=("hash", "merge"), default="hash")
+    merge_parser.add_argument("--allow-partial", action="store_true", help="merge even when some shards are missing")
+    merge_parser.set_defaults(function=merge)
+
+    demo_parser = commands.add_parser("demo", help="show an example tree")
+    demo_parser.set_defaults(function=demo)
+
+    args = parser.parse_args(argv)
+    args.function(args)
+
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
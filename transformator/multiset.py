@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from transformator.tree import SubtreeStore
+
+
+class SignedMultiset:
+    def __init__(self, keep_trees=True):
+        self.keep_trees = keep_trees
+
+        self._entries = defaultdict(dict)
+        self._provenances = defaultdict(set)
+
+        # subtrees are shared only for the lifetime of the multiset
+        self._store = SubtreeStore()
+
+    def get_key(self, tree):
+        try:
+            return tree.get_uid(self._store)
+        except ValueError:
+            # a visitor emitted a malformed pre-order, it can still be cancelled by its codes
+            return tree.codes
+
+    def add(self, tree, provenance, weight=1):
+        if weight == 0:
+            return
+
+        key = self.get_key(tree)
+        provenances = self._entries[key]
+        entry = provenances.get(provenance)
+
+        tree = tree if self.keep_trees else None
+
+        if entry is None:
+            provenances[provenance] = [weight, tree]
+            self._provenances[provenance].add(key)
+        else:
+            entry[0] += weight
+            entry[1] = tree
+
+    def attach(self, tree, provenance):
+        provenances = self._entries.get(self.get_key(tree))
+
+        if provenances is None:
+            return
+
+        entry = provenances.get(provenance)
+
+        if entry is not None:
+            entry[1] = tree
+
+    def discard_cancelled(self):
+        for key in [key for key, provenances in self._entries.items() if sum(weight for weight, _ in provenances.values()) == 0]:
+            for provenance in self._entries.pop(key):
+                self._provenances[provenance].discard(key)
+
+    def update(self, trees, provenance, weight=1):
+        for tree in trees:
+            self.add(tree, provenance, weight)
+
+    def discard(self, prefix):
+        for provenance in list(self._provenances):
+            if provenance[:len(prefix)] != prefix:
+                continue
+
+            for key in self._provenances.pop(provenance):
+                provenances = self._entries[key]
+                del provenances[provenance]
+
+                if len(provenances) == 0:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def residues(self):
+        for provenances in self._entries.values():
+            total = sum(weight for weight, _ in provenances.values())
+
+            if total == 0:
+                continue
+
+            sign = 1 if total > 0 else -1
+            remaining = abs(total)
+
+            # the merge-based diff cancels the lowest provenances first
+            for provenance in sorted(provenances, reverse=True):
+                weight, tree = provenances[provenance]
+
+                if weight * sign <= 0:
+                    continue
+
+                taken = min(abs(weight), remaining)
+                yield tree, provenance, sign * taken
+
+                remaining -= taken
+                if remaining == 0:
+                    break
+
+    def diff(self):
+        minus = []
+        plus = []
+
+        for tree, provenance, weight in self.residues():
+            side = plus if weight > 0 else minus
+            side.append((tree, provenance, abs(weight)))
+
+        sorting_key = lambda data: (str(data[0]), data[1][0], data[1][1], data[1][2])
+
+        minus.sort(key=sorting_key)
+        plus.sort(key=sorting_key)
+
+        return minus, plus
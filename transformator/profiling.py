@@ -0,0 +1,148 @@
+import json
+import time
+import tracemalloc
+
+from transformator.rules import Rule
+
+
+def describe_visitor(visitor):
+    if isinstance(visitor, Rule):
+        return f"{visitor.visit}: {visitor.template}"
+
+    return getattr(visitor, "__qualname__", None) or repr(visitor)
+
+
+class Profiler:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.parts = {}
+
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def get_stats(self, provenance, visit=None, visitor=None):
+        stats = self.parts.get(provenance)
+
+        if stats is None:
+            stats = self.parts[provenance] = {
+                "class": provenance[0],
+                "section": provenance[1],
+                "part": provenance[2],
+                "visit": visit,
+                "visitor": describe_visitor(visitor),
+                "runs": 0,
+                "input_trees": 0,
+                "visitor_calls": None if isinstance(visitor, Rule) else 0,
+                "emitted_trees": 0,
+                "seconds": 0.0,
+                "diff_seconds": 0.0,
+                "peak_bytes": None,
+            }
+
+        return stats
+
+    def profile_part(self, provenance, input_trees, visit, visitor, run):
+        stats = self.get_stats(provenance, visit, visitor)
+        stats["runs"] += 1
+        stats["input_trees"] += input_trees
+
+        # rules are applied without calling back into python visitors
+        if not isinstance(visitor, Rule):
+            visitor = self.count_calls(stats, visitor)
+
+        return self.measure(stats, run(visitor))
+
+    @staticmethod
+    def count_calls(stats, visitor):
+        def wrapper(*args):
+            stats["visitor_calls"] += 1
+            return visitor(*args)
+
+        return wrapper
+
+    @staticmethod
+    def measure(stats, items):
+        tracing = tracemalloc.is_tracing()
+
+        if tracing:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        items = iter(items)
+        elapsed = 0.0
+
+        try:
+            while True:
+                start = time.perf_counter()
+
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+
+                stats["emitted_trees"] += 1
+                yield item
+        finally:
+            stats["seconds"] += elapsed
+
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                stats["peak_bytes"] = max(stats["peak_bytes"] or 0, peak)
+
+    def add_diff_time(self, provenance, seconds):
+        self.get_stats(provenance)["diff_seconds"] += seconds
+
+    def report(self):
+        return [self.parts[provenance] for provenance in sorted(self.parts)]
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({"parts": self.report()}, f, indent=2)
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return json.load(f)["parts"]
+
+    def print_report(self, sort=None, limit=None, baseline=None):
+        parts = self.report()
+
+        if sort is not None:
+            parts = sorted(parts, key=lambda stats: stats[sort] or 0, reverse=True)
+
+        old = {}
+        for stats in baseline or []:
+            old[(stats["class"], stats["section"], stats["part"])] = stats
+
+        for stats in parts[:limit]:
+            calls = stats["visitor_calls"]
+            peak = stats["peak_bytes"]
+
+            line = (
+                f"{stats['class']},{stats['section']},{stats['part']}: "
+                f"{stats['seconds']:8.3f}s {stats['diff_seconds']:8.3f}s diff "
+                f"{stats['input_trees']:8d} in {'-' if calls is None else calls:>9} calls {stats['emitted_trees']:8d} out "
+                f"{'-' if peak is None else f'{peak / 2 ** 20:.2f}':>8} MiB | {stats['visitor']}"
+            )
+
+            previous = old.get((stats["class"], stats["section"], stats["part"]))
+
+            if previous is not None and previous["seconds"] > 0:
+                line += f" | x{stats['seconds'] / previous['seconds']:.2f} time"
+
+            print(line)
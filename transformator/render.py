@@ -0,0 +1,161 @@
+import html
+import itertools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+DISPLAY_LIMIT = 50
+
+
+class SvgCache:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def get_key(tree):
+        return tree.__class__, tree.codes
+
+    @staticmethod
+    def render(tree):
+        return tree.graph.pipe(format="svg").decode()
+
+    def __contains__(self, tree):
+        future = self._futures.get(self.get_key(tree))
+
+        return future is not None and future.done()
+
+    def __len__(self):
+        return len(self._futures)
+
+    def submit(self, tree):
+        key = self.get_key(tree)
+
+        with self._lock:
+            future = self._futures.get(key)
+
+            if future is not None:
+                return future
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="transformator-render")
+
+            future = self._futures[key] = self._executor.submit(self.render, tree)
+
+        # outside of the lock, the callback runs immediately when the render has already finished
+        future.add_done_callback(lambda future: self._forget_failed(key, future))
+
+        return future
+
+    def _forget_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+
+    def get(self, tree):
+        return self.submit(tree).result()
+
+    def prefetch(self, trees):
+        for tree in trees:
+            self.submit(tree)
+
+    def clear(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+
+            self._futures.clear()
+
+
+svg_cache = SvgCache()
+
+
+def when_done(futures, callback):
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+
+        if finished:
+            callback(futures)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def side_by_side_html(futures):
+    cells = []
+
+    for future in futures:
+        try:
+            cells.append(future.result())
+        except Exception as e:
+            cells.append(f"<pre>{html.escape(repr(e))}</pre>")
+
+    return "<div style='display: flex; align-items: center; gap: 1em'>" + "".join(f"<div>{cell}</div>" for cell in cells) + "</div>"
+
+
+def display_tree_rows(rows, cache=None):
+    from IPython.display import display, HTML
+
+    cache = cache or svg_cache
+
+    for labels, trees in rows:
+        futures = [cache.submit(tree) for tree in trees]
+        handle = display(HTML(f"<div>{html.escape(labels)}: rendering&hellip;</div>"), display_id=True)
+        get_html = lambda futures, labels=labels: HTML(f"<div>{html.escape(labels)}</div>" + side_by_side_html(futures))
+
+        # without a frontend there is nothing to update later
+        if handle is None:
+            display(get_html(futures))
+            continue
+
+        # the notebook keeps running while the svgs are rendered, each row is filled in when it is ready
+        when_done(futures, lambda futures, handle=handle, get_html=get_html: handle.update(get_html(futures)))
+
+
+def get_page(items, page=0, limit=DISPLAY_LIMIT):
+    start = page * limit
+
+    return list(itertools.islice(items, start, start + limit)), start
+
+
+def with_bases(trees):
+    for tree in trees:
+        yield tree
+        yield tree.extra["base"]
+
+
+def write_dot(path, items, name="trees"):
+    quote = lambda value: '"' + str(value).replace('"', '\\"') + '"'
+
+    with open(path, "w") as f:
+        f.write(f"graph {name} {{\n")
+
+        for i, (label, trees) in enumerate(items):
+            f.write(f"\tsubgraph cluster_{i} {{\n\t\tlabel={quote(label)}\n")
+
+            for j, tree in enumerate(trees):
+                for line in tree.to_dot(f"{i}_{j}_"):
+                    f.write(f"\t\t{line}\n")
+
+            f.write("\t}\n")
+
+        f.write("}\n")
+
+    return path
+
+
+def render_dot(path, format="svg", engine="dot"):
+    import graphviz
+
+    # a single layout process for the whole document
+    return graphviz.render(engine, format, path)
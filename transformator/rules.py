@@ -0,0 +1,269 @@
+import json
+
+from transformator.tree import node_codec
+
+
+VISITS = {
+    "subtree": "visit_subtrees",
+    "parent_subtree": "visit_parent_subtrees",
+    "left_parent_subtree": "visit_left_parent_subtrees",
+    "right_parent_subtree": "visit_right_parent_subtrees",
+}
+
+PLACEHOLDERS = ("kind", "parent_kind", "left", "right")
+
+
+def parse_node(token):
+    name = token.rstrip("*")
+    marks = tuple(token[len(name):])
+
+    return (None if name == "_" else name, ) + marks
+
+
+def parse_template(template):
+    result = []
+
+    for token in template.split():
+        if token.startswith("{") and token.endswith("}"):
+            name = token[1:-1].rstrip("*")
+            marks = tuple(token[1 + len(name):-1])
+
+            if name not in PLACEHOLDERS:
+                raise ValueError(f"Unknown placeholder {token} in template {template!r}")
+
+            result.append((name, marks))
+        else:
+            result.append((None, parse_node(token)))
+
+    return result
+
+
+def node_matches(pattern, node):
+    if pattern is None:
+        return True
+
+    if pattern == "leaf":
+        return node[0] is None
+
+    if pattern == "node":
+        return node[0] is not None
+
+    return node[0] in pattern
+
+
+class Rule:
+    def __init__(self, visit, template, kind=None, parent_kind=None):
+        if visit not in VISITS:
+            raise ValueError(f"Unknown visit {visit!r}, expected one of {list(VISITS)}")
+
+        self.visit = visit
+        self.template = template
+        self.kind = kind if kind in (None, "leaf", "node") else tuple(kind)
+        self.parent_kind = parent_kind if parent_kind in (None, "leaf", "node") else tuple(parent_kind)
+
+        self._segments = parse_template(template)
+        self._compiled = None
+
+        if visit == "subtree" and any(name == "parent_kind" for name, _ in self._segments):
+            raise ValueError(f"Template {template!r} uses {{parent_kind}} in a subtree rule")
+
+    @property
+    def visit_method(self):
+        return VISITS[self.visit]
+
+    @property
+    def segments(self):
+        return self._segments
+
+    @property
+    def key(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def to_dict(self):
+        result = {"visit": self.visit, "template": self.template}
+
+        if self.kind is not None:
+            result["kind"] = self.kind if isinstance(self.kind, str) else list(self.kind)
+
+        if self.parent_kind is not None:
+            result["parent_kind"] = self.parent_kind if isinstance(self.parent_kind, str) else list(self.parent_kind)
+
+        return result
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["visit"], data["template"], data.get("kind"), data.get("parent_kind"))
+
+    def __reduce__(self):
+        return self.__class__, (self.visit, self.template, self.kind, self.parent_kind)
+
+    def __repr__(self):
+        return f"Rule({self.visit!r}, {self.template!r}, kind={self.kind!r}, parent_kind={self.parent_kind!r})"
+
+    def __call__(self, *args):
+        if self.visit == "subtree":
+            kind, left, right = args
+            parent_kind = None
+        else:
+            kind, parent_kind, left, right = args
+
+        if not node_matches(self.kind, kind):
+            return None
+
+        if self.visit != "subtree" and not node_matches(self.parent_kind, parent_kind):
+            return None
+
+        values = {
+            "kind": [kind],
+            "parent_kind": [parent_kind],
+            "left": left,
+            "right": right,
+        }
+
+        result = []
+
+        for name, value in self._segments:
+            if name is None:
+                result.append(value)
+                continue
+
+            nodes = values[name]
+
+            if value and len(nodes) > 0:
+                result.append(nodes[0] + value)
+                result.extend(nodes[1:])
+            else:
+                result.extend(nodes)
+
+        return result
+
+    def _compile(self):
+        segments = []
+
+        for name, value in self._segments:
+            if name is None:
+                segments.append((None, node_codec.encode_all([value])))
+            else:
+                segments.append((name, value))
+
+        self._compiled = segments, {}, {}, {}
+
+    def _match_code(self, cache, pattern, code):
+        result = cache.get(code)
+
+        if result is None:
+            result = cache[code] = node_matches(pattern, node_codec.decode(code))
+
+        return result
+
+    def _mark_code(self, cache, marks, code):
+        key = (code, marks)
+        result = cache.get(key)
+
+        if result is None:
+            result = cache[key] = node_codec.encode(node_codec.decode(code) + marks)
+
+        return result
+
+    def _build(self, kind, parent_kind, left, right):
+        segments, _, _, marked = self._compiled
+
+        values = {
+            "kind": bytes((kind, )),
+            "parent_kind": bytes((parent_kind, )) if parent_kind is not None else b"",
+            "left": left,
+            "right": right,
+        }
+
+        pieces = []
+
+        for name, value in segments:
+            if name is None:
+                pieces.append(value)
+                continue
+
+            codes = values[name]
+
+            if value and len(codes) > 0:
+                pieces.append(bytes((self._mark_code(marked, value, codes[0]), )))
+                pieces.append(codes[1:])
+            else:
+                pieces.append(codes)
+
+        return b"".join(pieces)
+
+    def apply(self, tree):
+        if self._compiled is None:
+            self._compile()
+
+        _, kinds, parent_kinds, _ = self._compiled
+
+        leaves = node_codec.leaves
+        codes = tree.codes
+        ends = tree.subtree_ends
+
+        visit_left = self.visit in ("parent_subtree", "right_parent_subtree")
+        visit_right = self.visit in ("parent_subtree", "left_parent_subtree")
+
+        for i in range(len(codes)):
+            code = codes[i]
+            end = ends[i]
+
+            if self.visit == "subtree":
+                if not self._match_code(kinds, self.kind, code):
+                    continue
+
+                if end == i + 1:
+                    left = right = b""
+                else:
+                    middle = ends[i + 1]
+                    left = codes[i + 1:middle]
+                    right = codes[middle:end]
+
+                yield tree.splice_codes(i, end, self._build(code, None, left, right))
+                continue
+
+            if leaves[code] or not self._match_code(parent_kinds, self.parent_kind, code):
+                continue
+
+            middle = ends[i + 1]
+            left = codes[i + 1:middle]
+            right = codes[middle:end]
+
+            if visit_left and self._match_code(kinds, self.kind, left[0]):
+                yield tree.splice_codes(i, end, self._build(left[0], code, left, right))
+
+            if visit_right and self._match_code(kinds, self.kind, right[0]):
+                yield tree.splice_codes(i, end, self._build(right[0], code, left, right))
+
+
+def visit_tree(tree, visit, visitor):
+    if isinstance(visitor, Rule) and visitor.visit_method == visit:
+        return visitor.apply(tree)
+
+    return getattr(tree, visit)(visitor)
+
+
+def load_spec(path):
+    with open(path) as f:
+        return parse_spec(json.load(f))
+
+
+def parse_spec(data):
+    section_expressions = [
+        [tuple(section) for section in class_sections]
+        for class_sections in data["section_expressions"]
+    ]
+
+    sections = [
+        [
+            [
+                (part["multiplier"], VISITS[part["visit"]], Rule.from_dict(part))
+                for part in section_parts
+            ]
+            for section_parts in class_sections
+        ]
+        for class_sections in data["sections"]
+    ]
+
+    return section_expressions, sections
@@ -0,0 +1,251 @@
+import importlib
+import itertools
+import json
+import os
+import zlib
+
+from array import array
+
+from transformator.cache import NodeTable
+from transformator.context import Context, SectionPart, evaluate_class_chunk, fold_chunk_entries
+from transformator.rules import parse_spec
+from transformator.tree import LazyClass
+
+
+FORMAT_VERSION = 2
+MAGIC = b"TRANSFORMATOR-SHARD\n"
+
+CHUNK_SIZE = 1 << 12
+
+MODES = ("range", "hash")
+
+
+def load_tree_class(path):
+    module, _, name = path.rpartition(".")
+
+    return getattr(importlib.import_module(module), name)
+
+
+def get_tree_class_path(tree_class):
+    return f"{tree_class.__module__}.{tree_class.__qualname__}"
+
+
+def get_ns(n, section_expressions):
+    return list(range(n, n - len(section_expressions), -1))
+
+
+def shard_hash(tree):
+    # stable across processes, unlike hash()
+    return zlib.crc32(str(tree).encode())
+
+
+def select_shard(tree_class, n, index=0, count=1, mode="range"):
+    if mode == "range":
+        size = tree_class.count(n)
+        start = size * index // count
+        stop = size * (index + 1) // count
+
+        return enumerate(LazyClass(tree_class, n, start=start, stop=stop), start)
+
+    if mode == "hash":
+        return (
+            (base_idx, tree)
+            for base_idx, tree in enumerate(tree_class.generate(n))
+            if shard_hash(tree) % count == index
+        )
+
+    raise ValueError(f"Unknown shard mode {mode!r}, expected one of {list(MODES)}")
+
+
+def run_shard(spec, tree_class, n, index=0, count=1, mode="range", chunk_size=CHUNK_SIZE):
+    section_expressions, sections = parse_spec(spec)
+    ns = get_ns(n, section_expressions)
+
+    # per part: codes -> [count, base index of the last copy]
+    parts = {}
+
+    for class_idx, class_spec in enumerate(sections):
+        bases = select_shard(tree_class, ns[class_idx], index, count, mode)
+        # per part: codes -> [tree, count], folded in place chunk by chunk
+        results = [[{} for _ in section_spec] for section_spec in class_spec]
+
+        while True:
+            trees = []
+
+            for base_idx, tree in itertools.islice(bases, chunk_size):
+                tree.extra["base_idx"] = base_idx
+                trees.append(tree)
+
+            if not trees:
+                break
+
+            chunk = evaluate_class_chunk(trees, class_spec)
+
+            for section_idx, section_results in enumerate(results):
+                for part_idx, entries in enumerate(section_results):
+                    fold_chunk_entries(entries, chunk[section_idx][part_idx])
+
+        for section_idx, section_results in enumerate(results):
+            for part_idx, entries in enumerate(section_results):
+                parts[(class_idx, section_idx, part_idx)] = {
+                    tree.codes: [weight, tree.extra["base"].extra["base_idx"]]
+                    for tree, weight in entries.values()
+                }
+
+    header = {
+        "tree_class": get_tree_class_path(tree_class),
+        "n": n,
+        "spec": spec,
+        "shard": [index, count, mode],
+    }
+
+    return header, parts
+
+
+def write_shard(path, header, parts):
+    table = NodeTable()
+
+    for entries in parts.values():
+        for codes in entries:
+            table.add(codes)
+
+    header = dict(header, version=FORMAT_VERSION, nodes=table.nodes, parts=[
+        list(provenance) + [len(entries)] for provenance, entries in sorted(parts.items())
+    ])
+
+    translation = table.translation()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header).encode() + b"\n")
+
+        for _, entries in sorted(parts.items()):
+            counts = array("q")
+            bases = array("q")
+            offsets = array("Q", [0])
+            data = bytearray()
+
+            for codes, (count, base_idx) in entries.items():
+                counts.append(count)
+                bases.append(base_idx)
+
+                data.extend(codes)
+                offsets.append(len(data))
+
+            for values in (counts, bases, offsets):
+                f.write(values.tobytes())
+
+            f.write(bytes(data).translate(translation))
+
+    os.replace(tmp_path, path)
+
+
+def read_shard(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a transformator shard file")
+
+        header = json.loads(f.readline())
+
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has unsupported format version {header['version']}")
+
+        translation = NodeTable.load_translation(header["nodes"])
+        parts = {}
+
+        for *provenance, size in header["parts"]:
+            values = []
+
+            for typecode, length in (("q", size), ("q", size), ("Q", size + 1)):
+                result = array(typecode)
+                result.frombytes(f.read(result.itemsize * length))
+                values.append(result)
+
+            counts, bases, offsets = values
+            data = f.read(offsets[-1]).translate(translation)
+
+            parts[tuple(provenance)] = {
+                data[offsets[i]:offsets[i + 1]]: [counts[i], bases[i]]
+                for i in range(size)
+            }
+
+    return header, parts
+
+
+def merge_shards(paths, allow_partial=False):
+    header = None
+    merged = {}
+    seen = set()
+
+    for path in paths:
+        shard_header, parts = read_shard(path)
+
+        if header is None:
+            header = shard_header
+
+        for key in ("tree_class", "n", "spec"):
+            if shard_header[key] != header[key]:
+                raise ValueError(f"{path} was computed with a different {key} than {paths[0]}")
+
+        index, count, mode = shard_header["shard"]
+
+        if (count, mode) != tuple(header["shard"][1:]):
+            raise ValueError(f"{path} uses a different sharding than {paths[0]}")
+
+        if index in seen:
+            raise ValueError(f"Shard {index}/{count} was given twice")
+
+        seen.add(index)
+
+        for provenance, entries in parts.items():
+            result = merged.setdefault(provenance, {})
+
+            for codes, entry in entries.items():
+                previous = result.get(codes)
+
+                if previous is None:
+                    result[codes] = entry
+                else:
+                    # every base belongs to one shard, the copy from the highest base is the one generated last
+                    previous[0] += entry[0]
+                    previous[1] = max(previous[1], entry[1])
+
+    missing = sorted(set(range(header["shard"][1])) - seen)
+
+    if missing and not allow_partial:
+        raise ValueError(f"Missing shards {missing} of {header['shard'][1]}")
+
+    return build_context(header, merged)
+
+
+def build_context(header, parts):
+    tree_class = load_tree_class(header["tree_class"])
+    section_expressions, sections = parse_spec(header["spec"])
+
+    context = Context(lazy_classes=True)
+    context.ns = get_ns(header["n"], section_expressions)
+    context.class_constructor = tree_class
+    context.section_expressions = section_expressions
+
+    for provenance in sorted(parts):
+        class_idx, section_idx, part_idx = provenance
+        multiplier, visit, visitor = sections[class_idx][section_idx][part_idx]
+
+        entries = [
+            (tree_class.from_codes(codes, base_idx=base_idx), count)
+            for codes, (count, base_idx) in sorted(parts[provenance].items(), key=lambda item: item[1][1])
+        ]
+
+        part = SectionPart(context, class_idx, multiplier, visit, visitor, entries=entries, provenance=provenance)
+        context.add_section_part(class_idx, section_idx, part)
+
+    return context
+
+
+def attach_bases(context, entries):
+    for tree, provenance, _ in entries:
+        if "base" not in tree.extra:
+            tree.extra["base"] = context.classes[provenance[0]][tree.extra["base_idx"]]
+
+    return entries
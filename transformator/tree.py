@@ -1,21 +1,437 @@
+import functools as fn
+import itertools
+
+from array import array
+
 from graphviz import Graph
 
+from transformator.render import svg_cache
+
+
+class NodeCodec:
+    max_codes = 256
+
+    def __init__(self):
+        self.nodes = []
+        self.codes = {}
+        self.leaves = bytearray()
+
+        self.encode((None, ))
+
+    def encode(self, node):
+        node = node if isinstance(node, tuple) else (node, )
+
+        code = self.codes.get(node)
+
+        if code is None:
+            code = len(self.nodes)
+
+            if code >= self.max_codes:
+                raise ValueError(f"Too many distinct nodes, cannot encode {node}")
+
+            self.codes[node] = code
+            self.nodes.append(node)
+            self.leaves.append(node[0] is None)
+
+        return code
+
+    def encode_all(self, pre_order):
+        return bytes(self.encode(node) for node in pre_order)
+
+    def decode(self, code):
+        return self.nodes[code]
+
+    def decode_all(self, codes):
+        nodes = self.nodes
+
+        return [nodes[code] for code in codes]
+
+
+node_codec = NodeCodec()
+
+
+class SubtreeStore:
+    # generations are unique across stores, a cached uid is only valid for the store that produced it
+    generations = itertools.count()
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ids = {}
+        self.subtrees = []
+        self.positions = {}
+        self.generation = next(self.generations)
+
+    def __len__(self):
+        return len(self.subtrees)
+
+    def get_id(self, subtree):
+        result = self.ids.get(subtree)
+
+        if result is None:
+            result = self.ids[subtree] = len(self.subtrees)
+            self.subtrees.append(subtree)
+
+        return result
+
+    def intern(self, codes):
+        leaves = node_codec.leaves
+        ids = self.ids
+
+        stack = []
+
+        try:
+            for code in reversed(codes):
+                if leaves[code]:
+                    subtree = (code, )
+                else:
+                    subtree = (code, stack.pop(), stack.pop())
+
+                uid = ids.get(subtree)
+                stack.append(uid if uid is not None else self.get_id(subtree))
+        except IndexError:
+            raise ValueError(f"Cannot intern malformed pre-order {node_codec.decode_all(codes)}") from None
+
+        if len(stack) != 1:
+            raise ValueError(f"Cannot intern malformed pre-order {node_codec.decode_all(codes)}")
+
+        return stack[0]
+
+    def intern_all(self, codes):
+        leaves = node_codec.leaves
+        ids = self.ids
+
+        # uid of the subtree starting at every position
+        result = array("i", bytes(4 * len(codes)))
+        stack = []
+
+        try:
+            for i in range(len(codes) - 1, -1, -1):
+                code = codes[i]
+
+                if leaves[code]:
+                    subtree = (code, )
+                else:
+                    subtree = (code, stack.pop(), stack.pop())
+
+                uid = ids.get(subtree)
+                uid = result[i] = uid if uid is not None else self.get_id(subtree)
+                stack.append(uid)
+        except IndexError:
+            raise ValueError(f"Cannot intern malformed pre-order {node_codec.decode_all(codes)}") from None
+
+        if len(stack) != 1:
+            raise ValueError(f"Cannot intern malformed pre-order {node_codec.decode_all(codes)}")
+
+        return result
+
+    def get_position_uids(self, codes):
+        result = self.positions.get(codes)
+
+        if result is None:
+            result = self.positions[codes] = self.intern_all(codes)
+
+        return result
+
+    def get_codes(self, uid):
+        result = bytearray()
+        stack = [uid]
+
+        while stack:
+            subtree = self.subtrees[stack.pop()]
+            result.append(subtree[0])
+
+            if len(subtree) > 1:
+                stack.append(subtree[2])
+                stack.append(subtree[1])
+
+        return bytes(result)
+
+
+class LazyClass:
+    def __init__(self, tree_class, n, kinds=None, start=0, stop=None):
+        self.tree_class = tree_class
+        self.n = n
+        self.kinds = tree_class.get_kinds(kinds)
+
+        size = tree_class.count(n, self.kinds)
+
+        self.start = min(start, size)
+        self.stop = size if stop is None else min(stop, size)
+
+    def __len__(self):
+        return max(0, self.stop - self.start)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+
+            return self.__class__(self.tree_class, self.n, self.kinds, self.start + start, self.start + max(start, stop))
+
+        if idx < 0:
+            idx += len(self)
+
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+
+        return self.tree_class.unrank(self.n, self.start + idx, self.kinds)
+
+    def __iter__(self):
+        for idx in range(self.start, self.stop):
+            yield self.tree_class.unrank(self.n, idx, self.kinds)
+
+    def sample(self, k, random=None):
+        import random as random_module
+
+        random = random or random_module
+
+        return [self[i] for i in random.sample(range(len(self)), k)]
+
+
+class PointedTree:
+    __slots__ = ("base", "position", "pointer")
+
+    def __init__(self, base, position, pointer):
+        self.base = base
+        self.position = position
+        self.pointer = pointer
+
+    def materialize(self):
+        return self.base.point(self.position, self.pointer)
+
+    def __len__(self):
+        return len(self.base)
+
+    def __str__(self):
+        return str(self.materialize())
+
+    def __repr__(self):
+        return f"PointedTree({self.base!r}, {self.position!r}, {self.pointer!r})"
+
+
+class LazyPointedClass:
+    def __init__(self, tree_class, n, kinds=None, pointers=None, start=0, stop=None):
+        self.tree_class = tree_class
+        self.n = n
+        self.kinds = tree_class.get_kinds(kinds)
+        self.pointers = tuple(pointers or tree_class.pointers)
+
+        # every tree of the class has the same number of nodes
+        self.tree_size = tree_class.tree_size(n)
+        self.bases = LazyClass(tree_class, n, self.kinds)
+
+        size = len(self.bases) * len(self.pointers) * self.tree_size
+
+        self.start = min(start, size)
+        self.stop = size if stop is None else min(stop, size)
+
+    def __len__(self):
+        return max(0, self.stop - self.start)
+
+    def locate(self, idx):
+        base_idx, rest = divmod(idx, len(self.pointers) * self.tree_size)
+        pointer_idx, position = divmod(rest, self.tree_size)
+
+        return base_idx, position, self.pointers[pointer_idx]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+
+            return self.__class__(self.tree_class, self.n, self.kinds, self.pointers, self.start + start, self.start + max(start, stop))
+
+        if idx < 0:
+            idx += len(self)
+
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+
+        base_idx, position, pointer = self.locate(self.start + idx)
+
+        return PointedTree(self.bases[base_idx], position, pointer)
+
+    def __iter__(self):
+        if len(self) == 0:
+            return
+
+        first, _, _ = self.locate(self.start)
+        last, _, _ = self.locate(self.stop - 1)
+
+        idx = first * len(self.pointers) * self.tree_size
+
+        # each base is built once and shared by all of its pointed trees
+        if first == 0:
+            bases = itertools.islice(self.tree_class.generate(self.n, self.kinds), last + 1)
+        else:
+            bases = self.bases[first:last + 1]
+
+        for base in bases:
+            for pointer in self.pointers:
+                for position in range(self.tree_size):
+                    if self.start <= idx < self.stop:
+                        yield PointedTree(base, position, pointer)
+
+                    idx += 1
+
+    def materialize(self):
+        for pointed in self:
+            yield pointed.materialize()
+
+    def sample(self, k, random=None):
+        import random as random_module
+
+        random = random or random_module
+
+        return [self[i] for i in random.sample(range(len(self)), k)]
+
 
 class Tree:
+    __slots__ = ("_codes", "_patch", "_index", "_uid", "extra")
+
     shape = "plain"
     arity = 2
     kinds = ["o"]
     pointers = ["*"]
 
     def __init__(self, pre_order, **extra):
-        self.pre_order = [k if isinstance(k, tuple) else (k, ) for k in pre_order]
+        self._codes = node_codec.encode_all(pre_order)
+        self._patch = None
+        self._index = None
+        self._uid = None
         self.extra = extra
 
+    @classmethod
+    def from_codes(cls, codes, **extra):
+        result = cls.__new__(cls)
+        result._codes = codes
+        result._patch = None
+        result._index = None
+        result._uid = None
+        result.extra = extra
+
+        return result
+
+    @classmethod
+    def from_patch(cls, patch, **extra):
+        # patch is (base tree, start, end, codes), a view of the base codes with [start:end] replaced
+        result = cls.__new__(cls)
+        result._codes = None
+        result._patch = patch
+        result._index = None
+        result._uid = None
+        result.extra = extra
+
+        return result
+
+    @classmethod
+    def from_uid(cls, uid, store, **extra):
+        return cls.from_codes(store.get_codes(uid), **extra)
+
+    @property
+    def codes(self):
+        if self._codes is None:
+            self._codes = b"".join(self.segments)
+
+        return self._codes
+
+    @property
+    def segments(self):
+        if self._codes is not None:
+            return (self._codes, )
+
+        base, start, end, codes = self._patch
+        base_codes = memoryview(base.codes)
+
+        return base_codes[:start], codes, base_codes[end:]
+
+    def iter_codes(self):
+        return itertools.chain.from_iterable(self.segments)
+
+    def iter_codes_reversed(self):
+        if self._codes is not None:
+            return reversed(self._codes)
+
+        return itertools.chain.from_iterable(memoryview(segment)[::-1] for segment in reversed(self.segments))
+
+    @property
+    def pre_order(self):
+        return node_codec.decode_all(self.codes)
+
     def __iter__(self):
-        return iter(self.pre_order)
+        nodes = node_codec.nodes
+
+        return (nodes[code] for code in self.iter_codes())
+
+    def __len__(self):
+        if self._codes is not None:
+            return len(self._codes)
+
+        base, start, end, codes = self._patch
+
+        return len(base) - (end - start) + len(codes)
+
+    def get_uid(self, store):
+        if self._uid is None or self._uid[0] != store.generation:
+            uid = self._intern_patch(store) if self._patch is not None else None
+            self._uid = store.generation, uid if uid is not None else store.intern(self.codes)
+
+        return self._uid[1]
+
+    def _intern_patch(self, store):
+        base, start, end, codes = self._patch
+
+        if start >= len(base) or base.subtree_ends[start] != end:
+            return None
+
+        try:
+            uid = store.intern(codes)
+        except ValueError:
+            return None
+
+        base_codes = base.codes
+        ends = base.subtree_ends
+        parents = base.parents
+        uids = store.get_position_uids(base_codes)
+        get_id = store.get_id
+
+        # only the ancestors of the replaced subtree change, their other children keep the uids of the base
+        child = start
+        parent = parents[start]
+
+        while parent >= 0:
+            left = parent + 1
+
+            if child == left:
+                uid = get_id((base_codes[parent], uid, uids[ends[left]]))
+            else:
+                uid = get_id((base_codes[parent], uids[left], uid))
+
+            child = parent
+            parent = parents[parent]
+
+        return uid
+
+    def __hash__(self):
+        return hash(self.codes)
+
+    def __eq__(self, other):
+        if not isinstance(other, Tree):
+            return NotImplemented
+
+        return self.__class__ is other.__class__ and self.codes == other.codes
+
+    def __reduce__(self):
+        return self.__class__, (self.pre_order, ), (None, {"extra": self.extra})
 
     def _repr_svg_(self):
-        return self.graph._repr_svg_()
+        return svg_cache.get(self)
 
     def _repr_html_(self):
         return self._repr_svg_()
@@ -80,132 +496,529 @@ class Tree:
 
         return graph
 
-    def get_subtree(self, idx):
-        start = idx
-        end = idx
+    @staticmethod
+    def format_dot_attrs(attrs):
+        if len(attrs) == 0:
+            return ""
+
+        quote = lambda value: '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+        return " [" + " ".join(f"{key}={quote(value)}" for key, value in attrs.items()) + "]"
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _dot_node_attrs(cls, code):
+        return cls.format_dot_attrs(cls([(None, )]).get_kind_node_dict(node_codec.decode(code)))
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _dot_edge_attrs(cls, code, parent_code):
+        return cls.format_dot_attrs(cls([(None, )]).get_kind_edge_dict(node_codec.decode(code), node_codec.decode(parent_code)))
 
-        count = 1
-        while count > 0:
-            if self.pre_order[end][0] is None:
-                count -= 1
+    def to_dot(self, prefix=""):
+        codes = self.codes
+        parents = self.parents
+
+        result = []
+
+        for i, code in enumerate(codes):
+            if i == 0 and node_codec.leaves[code]:
+                continue
+
+            result.append(f'"{prefix}{i}"{self._dot_node_attrs(code)}')
+
+            if i > 0:
+                parent = parents[i]
+                result.append(f'"{prefix}{parent}" -- "{prefix}{i}"{self._dot_edge_attrs(code, codes[parent])}')
+
+        return result
+
+    @property
+    def subtree_ends(self):
+        if self._index is None:
+            self._build_index()
+
+        return self._index[0]
+
+    @property
+    def parents(self):
+        if self._index is None:
+            self._build_index()
+
+        return self._index[1]
+
+    def _build_index(self):
+        leaves = node_codec.leaves
+        codes = self.codes
+        size = len(codes)
+
+        ends = array("i", bytes(4 * (size + 1)))
+        parents = array("i", bytes(4 * size))
+
+        ends[size] = size
+
+        for i in range(size - 1, -1, -1):
+            if leaves[codes[i]]:
+                ends[i] = i + 1
             else:
-                count += 1
+                middle = ends[i + 1]
+                ends[i] = ends[middle]
 
-            end += 1
+                parents[i + 1] = i
+                parents[middle] = i
 
-        return self.pre_order[start:end]
+        if size > 0:
+            parents[0] = -1
 
-    def split_subree(self, idx):
-        pre = self.pre_order[:idx]
+        self._index = ends, parents
 
-        kind = self.pre_order[idx]
+    def get_subtree_end(self, idx):
+        return self.subtree_ends[idx]
 
-        if kind[0] is not None:
-            left = self.get_subtree(idx + 1)
-            right = self.get_subtree(idx + 1 + len(left))
-        else:
-            left = []
-            right = []
+    def get_children(self, idx):
+        if node_codec.leaves[self.codes[idx]]:
+            return ()
 
-        post = self.pre_order[idx + 1 + len(left) + len(right):]
+        return idx + 1, self.subtree_ends[idx + 1]
+
+    def get_parent(self, idx):
+        return self.parents[idx]
+
+    def get_subtree(self, idx):
+        return node_codec.decode_all(self.codes[idx:self.get_subtree_end(idx)])
+
+    def split_subree(self, idx):
+        codes = self.codes
+
+        kind, left, right, end = self._split(idx)
+
+        pre = node_codec.decode_all(codes[:idx])
+        post = node_codec.decode_all(codes[end:])
 
         return pre, kind, left, right, post
 
+    def _split(self, idx):
+        codes = self.codes
+        ends = self.subtree_ends
+
+        kind = node_codec.decode(codes[idx])
+        end = ends[idx]
+
+        if end == idx + 1:
+            return kind, [], [], end
+
+        middle = ends[idx + 1]
+
+        left = node_codec.decode_all(codes[idx + 1:middle])
+        right = node_codec.decode_all(codes[middle:end])
+
+        return kind, left, right, end
+
+    def splice(self, start, end, pre_order):
+        return self.splice_codes(start, end, node_codec.encode_all(pre_order))
+
+    def splice_codes(self, start, end, codes):
+        return self.__class__.from_patch((self, start, end, codes), base=self)
+
     def visit_subtrees(self, func):
-        for i in range(len(self.pre_order)):
-            pre, kind, left, right, post = self.split_subree(i)
+        for i in range(len(self)):
+            kind, left, right, end = self._split(i)
             result = func(kind, left, right)
 
             if result is not None:
-                yield self.__class__(pre + result + post, base=self)
+                yield self.splice(i, end, result)
 
     def visit_left_parent_subtrees(self, func):
-        for i in range(len(self.pre_order)):
-            pre, kind, left, right, post = self.split_subree(i)
+        for i in range(len(self)):
+            kind, left, right, end = self._split(i)
 
             if len(right) > 0:
                 result = func(right[0], kind, left, right)
 
                 if result is not None:
-                    yield self.__class__(pre + result + post, base=self)
+                    yield self.splice(i, end, result)
 
     def visit_right_parent_subtrees(self, func):
-        for i in range(len(self.pre_order)):
-            pre, kind, left, right, post = self.split_subree(i)
+        for i in range(len(self)):
+            kind, left, right, end = self._split(i)
 
             if len(left) > 0:
                 result = func(left[0], kind, left, right)
 
                 if result is not None:
-                    yield self.__class__(pre + result + post, base=self)
+                    yield self.splice(i, end, result)
 
     def visit_parent_subtrees(self, func):
-        for i in range(len(self.pre_order)):
-            pre, kind, left, right, post = self.split_subree(i)
+        for i in range(len(self)):
+            kind, left, right, end = self._split(i)
 
             if len(left) > 0:
                 result = func(left[0], kind, left, right)
 
                 if result is not None:
-                    yield self.__class__(pre + result + post, base=self)
+                    yield self.splice(i, end, result)
 
             if len(right) > 0:
                 result = func(right[0], kind, left, right)
 
                 if result is not None:
-                    yield self.__class__(pre + result + post, base=self)
+                    yield self.splice(i, end, result)
 
     def validate(self):
-        stack = []
+        return self._validate_reversed(self.iter_codes_reversed(), bytearray(len(self)))
 
-        stack.append((self.pre_order[0], []))
+    @classmethod
+    def validate_all(cls, trees):
+        result = []
+        stack = bytearray()
+
+        for tree in trees:
+            if len(stack) < len(tree):
+                stack = bytearray(len(tree))
+
+            result.append(cls._validate_reversed(tree.iter_codes_reversed(), stack))
+
+        return result
 
-        for kind in self.pre_order[1:]:
-            if len(stack) == 0:
+    @classmethod
+    def _validate_reversed(cls, codes, stack):
+        leaves = node_codec.leaves
+        table = cls._vertex_table()
+
+        # roots of the pending subtrees, codes fit in a byte
+        top = 0
+
+        for code in codes:
+            if leaves[code]:
+                stack[top] = code
+                top += 1
+                continue
+
+            if top < 2:
                 return False
 
-            p_kind, p_children = stack.pop()
-            p_children.append(kind)
+            left = stack[top - 1]
+            right = stack[top - 2]
 
-            if len(p_children) < self.arity:
-                stack.append((p_kind, p_children))
-            else:
-                if not self.validate_vertex(p_kind, p_children):
-                    return False
+            allowed = table.get((code << 16) | (left << 8) | right)
 
-            if kind[0] is not None:
-                stack.append((kind, []))
+            if allowed is None:
+                allowed = cls.vertex_allowed(code, left, right)
 
-        if len(stack) > 0:
-            return False
+            if not allowed:
+                return False
 
-        return True
+            top -= 1
+            stack[top - 1] = code
+
+        return top == 1
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _vertex_table(cls):
+        # (kind, left root, right root) codes packed into one int -> validate_vertex result
+        return {}
+
+    @classmethod
+    def vertex_allowed(cls, code, left, right):
+        table = cls._vertex_table()
+        key = (code << 16) | (left << 8) | right
+
+        result = table.get(key)
+
+        if result is None:
+            result = table[key] = bool(cls._allows(node_codec.decode(code), node_codec.decode(left), node_codec.decode(right)))
+
+        return result
 
     def validate_vertex(self, kind, children):
         return True
 
+    @classmethod
+    def get_kinds(cls, kinds=None):
+        return tuple(kinds or cls.kinds)
+
     @classmethod
     def generate(cls, n, kinds=None, validate=True):
-        kinds = kinds or cls.kinds
+        kinds = cls.get_kinds(kinds)
+
+        # the empty tree is a lone leaf, whatever the kinds
+        if n == 0:
+            yield cls([None])
+            return
+
+        if not validate:
+            for codes in cls._combine_families(n, kinds):
+                yield cls.from_codes(codes)
+
+            return
 
+        for kind in kinds:
+            for codes in cls._combine_valid(n, kinds, (kind, )):
+                yield cls.from_codes(codes)
+
+    @classmethod
+    def _combine_families(cls, n, kinds):
         if n == 0:
-            yield cls([(None, )])
+            yield node_codec.encode_all([None])
 
         else:
             for kind in kinds:
+                kind_codes = node_codec.encode_all([kind])
+
                 for i in range(n):
-                    left_n = n - i - 1
-                    right_n = i
+                    left_family = cls._family(n - i - 1, kinds)
+                    right_family = cls._family(i, kinds)
 
-                    for left in cls.generate(left_n, kinds, validate=False):
-                        for right in cls.generate(right_n, kinds, validate=False):
-                            result = cls([(kind, )] + left.pre_order + right.pre_order)
+                    for left in left_family:
+                        for right in right_family:
+                            yield kind_codes + left + right
 
-                            if validate:
-                                if result.validate():
-                                    yield result
-                            else:
-                                yield result
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _family(cls, n, kinds):
+        return tuple(cls._combine_families(n, kinds))
+
+    @classmethod
+    def _combine_valid(cls, n, kinds, root):
+        if root[0] is None:
+            if n == 0:
+                yield node_codec.encode_all([None])
+
+            return
+
+        root_codes = node_codec.encode_all([root])
+
+        for i in range(n):
+            for left_root, right_roots in cls._child_roots(kinds, root):
+                left_family = cls._valid_family(n - i - 1, kinds, left_root)
+
+                if len(left_family) == 0:
+                    continue
+
+                right_families = [cls._valid_family(i, kinds, right_root) for right_root in right_roots]
+
+                for left in left_family:
+                    for right_family in right_families:
+                        for right in right_family:
+                            yield root_codes + left + right
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _valid_family(cls, n, kinds, root):
+        if cls._count_rooted(n, kinds, root) == 0:
+            return ()
+
+        return tuple(cls._combine_valid(n, kinds, root))
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _child_roots(cls, kinds, root):
+        result = []
+
+        for left_root in cls._roots(kinds):
+            right_roots = tuple(
+                right_root
+                for right_root in cls._roots(kinds)
+                if cls._allows(root, left_root, right_root)
+            )
+
+            if len(right_roots) > 0:
+                result.append((left_root, right_roots))
+
+        return tuple(result)
+
+    @classmethod
+    def count(cls, n, kinds=None):
+        kinds = cls.get_kinds(kinds)
+
+        if n == 0:
+            return 1
+
+        return sum(cls._count_rooted(n, kinds, (kind, )) for kind in kinds)
+
+    @classmethod
+    def _roots(cls, kinds):
+        return [(None, )] + [(kind, ) for kind in kinds]
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _count_rooted(cls, n, kinds, root):
+        if n < 0:
+            return 0
+
+        if root[0] is None:
+            return 1 if n == 0 else 0
+
+        result = 0
+
+        for i in range(n):
+            for left_root, right_roots in cls._child_roots(kinds, root):
+                left_count = cls._count_rooted(n - i - 1, kinds, left_root)
+
+                if left_count == 0:
+                    continue
+
+                for right_root in right_roots:
+                    result += left_count * cls._count_rooted(i, kinds, right_root)
+
+        return result
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _allows(cls, kind, left_root, right_root):
+        return cls([(None, )]).validate_vertex(kind, [left_root, right_root])
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _right_count(cls, n, kinds, root, left_root):
+        return sum(
+            cls._count_rooted(n, kinds, right_root)
+            for right_root in cls._roots(kinds)
+            if cls._allows(root, left_root, right_root)
+        )
+
+    @classmethod
+    @fn.lru_cache(maxsize=None)
+    def _split_count(cls, n, kinds, root, right_n):
+        return sum(
+            cls._count_rooted(n - right_n - 1, kinds, left_root) * cls._right_count(right_n, kinds, root, left_root)
+            for left_root in cls._roots(kinds)
+        )
+
+    @classmethod
+    def unrank(cls, n, idx, kinds=None):
+        kinds = cls.get_kinds(kinds)
+
+        if not 0 <= idx < cls.count(n, kinds):
+            raise IndexError(f"{cls.__name__} of size {n} has no tree {idx}")
+
+        if n == 0:
+            return cls([None])
+
+        for kind in kinds:
+            root = (kind, )
+            size = cls._count_rooted(n, kinds, root)
+
+            if idx < size:
+                return cls.from_codes(cls._unrank_rooted(n, kinds, root, idx))
+
+            idx -= size
+
+    @classmethod
+    def _unrank_rooted(cls, n, kinds, root, idx):
+        if root[0] is None:
+            return node_codec.encode_all([root])
+
+        for right_n in range(n):
+            size = cls._split_count(n, kinds, root, right_n)
+
+            if idx >= size:
+                idx -= size
+                continue
+
+            left_n = n - right_n - 1
+
+            for left_root in cls._roots(kinds):
+                right_size = cls._right_count(right_n, kinds, root, left_root)
+                size = cls._count_rooted(left_n, kinds, left_root) * right_size
+
+                if idx >= size:
+                    idx -= size
+                    continue
+
+                left_idx, idx = divmod(idx, right_size)
+
+                for right_root in cls._roots(kinds):
+                    if not cls._allows(root, left_root, right_root):
+                        continue
+
+                    size = cls._count_rooted(right_n, kinds, right_root)
+
+                    if idx >= size:
+                        idx -= size
+                        continue
+
+                    return (
+                        node_codec.encode_all([root])
+                        + cls._unrank_rooted(left_n, kinds, left_root, left_idx)
+                        + cls._unrank_rooted(right_n, kinds, right_root, idx)
+                    )
+
+        raise IndexError(idx)
+
+    def rank(self, kinds=None):
+        kinds = self.get_kinds(kinds)
+
+        n = len(self) // 2
+        root = node_codec.decode(self.codes[0])
+
+        if n == 0 and self.count(0, kinds) == 1:
+            return 0
+
+        result = 0
+
+        for kind in kinds:
+            if (kind, ) == root:
+                return result + self._rank_rooted(0, kinds)
+
+            result += self._count_rooted(n, kinds, (kind, ))
+
+        raise ValueError(f"{self} is not a tree of kinds {kinds}")
+
+    def _rank_rooted(self, idx, kinds):
+        codes = self.codes
+        ends = self.subtree_ends
+        roots = self._roots(kinds)
+
+        root = node_codec.decode(codes[idx])
+
+        if root[0] is None:
+            return 0
+
+        middle = ends[idx + 1]
+        end = ends[idx]
+
+        left_n = (middle - idx - 1) // 2
+        right_n = (end - middle) // 2
+        n = left_n + right_n + 1
+
+        left_root = node_codec.decode(codes[idx + 1])
+        right_root = node_codec.decode(codes[middle])
+
+        if left_root not in roots or right_root not in roots or not self._allows(root, left_root, right_root):
+            raise ValueError(f"{self} is not a valid tree of kinds {kinds}")
+
+        result = sum(self._split_count(n, kinds, root, j) for j in range(right_n))
+
+        for r in roots:
+            if r == left_root:
+                break
+
+            result += self._count_rooted(left_n, kinds, r) * self._right_count(right_n, kinds, root, r)
+
+        result += self._rank_rooted(idx + 1, kinds) * self._right_count(right_n, kinds, root, left_root)
+
+        for r in roots:
+            if r == right_root:
+                break
+
+            if self._allows(root, left_root, r):
+                result += self._count_rooted(right_n, kinds, r)
+
+        return result + self._rank_rooted(middle, kinds)
+
+    @classmethod
+    def tree_size(cls, n):
+        return cls.arity * n + 1
+
+    @staticmethod
+    @fn.lru_cache(maxsize=None)
+    def _pointed_code(code, pointer):
+        return node_codec.encode(node_codec.decode(code) + (pointer, ))
+
+    def point(self, position, pointer):
+        return self.splice_codes(position, position + 1, bytes((self._pointed_code(self.codes[position], pointer), )))
 
     @classmethod
     def generate_pointed(cls, n, kinds=None, pointers=None):
@@ -213,8 +1026,16 @@ class Tree:
 
         for tree in cls.generate(n, kinds):
             for pointer in pointers:
-                for t in tree.visit_subtrees(lambda kind, left, right: [kind + (pointer, )] + left + right):
-                    yield t
+                for position in range(len(tree)):
+                    yield tree.point(position, pointer)
+
+    @classmethod
+    def pointed_class(cls, n, kinds=None, pointers=None):
+        return LazyPointedClass(cls, n, kinds, pointers)
+
+    @classmethod
+    def count_pointed(cls, n, kinds=None, pointers=None):
+        return cls.count(n, kinds) * len(pointers or cls.pointers) * cls.tree_size(n)
 
     def with_pointers_removed(self):
         return self.__class__(k[0] for k in self.pre_order)
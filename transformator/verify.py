@@ -0,0 +1,97 @@
+from transformator.rules import visit_tree
+
+
+MAX_EXAMPLES = 10
+
+
+def confirm_collision(trees, key, first, second, specs):
+    outputs = []
+
+    for part_idx, base_idx in (first, second):
+        _, visit, visitor = specs[part_idx]
+        outputs.append([t.codes for t in visit_tree(trees[base_idx], visit, visitor) if hash(t.codes) == key])
+
+    # one base reaching the same output twice
+    if first == second:
+        return len(outputs[0]) != len(set(outputs[0]))
+
+    return len(set(outputs[0]) & set(outputs[1])) > 0
+
+
+def verify_section(context, class_idx, section_idx, max_examples=MAX_EXAMPLES):
+    trees = context.classes[class_idx]
+    parts = context.sections[class_idx][section_idx]
+    specs = [(part.multiplier, part.visit, part.visitor) for part in parts]
+
+    # hashed encodings of the outputs, mapped to the first (part, base) that produced them, packed into one int
+    indexes = {True: {}, False: {}}
+    parts_count = len(specs)
+    collisions = []
+    collision_count = 0
+
+    part_reports = []
+
+    for part_idx, (_, visit, visitor) in enumerate(specs):
+        covered = bytearray(len(trees))
+        outputs = 0
+
+        index = indexes[specs[part_idx][0] > 0]
+
+        for tree, base_idx in context.visit_part_class(class_idx, visit, visitor):
+            outputs += 1
+            covered[base_idx] = 1
+
+            key = hash(tree.codes)
+            source = base_idx * parts_count + part_idx
+            previous = index.get(key)
+
+            if previous is None:
+                index[key] = source
+                continue
+
+            collision_count += 1
+
+            if len(collisions) < max_examples:
+                collisions.append((key, divmod(previous, parts_count)[::-1], (part_idx, base_idx)))
+
+        part_reports.append({
+            "part": part_idx,
+            "multiplier": specs[part_idx][0],
+            "outputs": outputs,
+            "covered_bases": sum(covered),
+            "class_size": len(trees),
+        })
+
+    examples = []
+
+    for key, first, second in collisions:
+        examples.append({
+            "first": first,
+            "second": second,
+            "confirmed": confirm_collision(trees, key, first, second, specs),
+        })
+
+    expected = context.section_counts[class_idx][section_idx]
+    outputs = sum(part["multiplier"] * part["outputs"] for part in part_reports)
+
+    return {
+        "class": class_idx,
+        "section": section_idx,
+        "expected": expected,
+        "outputs": outputs,
+        "distinct": sum(len(index) for index in indexes.values()),
+        "collision_count": collision_count,
+        "collisions": examples,
+        "parts": part_reports,
+        "injective": collision_count == 0,
+    }
+
+
+def verify_context(context, class_idx=None, max_examples=MAX_EXAMPLES):
+    class_idxs = range(len(context.sections)) if class_idx is None else [class_idx]
+
+    return [
+        verify_section(context, i, j, max_examples)
+        for i in class_idxs
+        for j in range(len(context.sections[i]))
+    ]